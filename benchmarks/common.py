@@ -0,0 +1,52 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+from scales import C2, get_scale
+from engine import Engine
+from rng import BlockRNG
+
+
+SCALE = get_scale(C2, 'aeolian/minor', 2)
+
+
+class NullPort(object):
+    """ Output port discarding every message, counting them
+
+        Accepts raw bytes like the rtmidi backend does.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def send(self, msg):
+        self.count += 1
+
+    def send_bytes(self, data):
+        self.count += 1
+
+
+def make_engine(classes, n_players, seed=0, port=None):
+    """ Engine with n_players active players cycling through classes
+
+        Returns:
+            (engine, port)
+    """
+    port = port or NullPort()
+    rng = BlockRNG(seed)
+    engine = Engine(rng=rng)
+    for i in range(n_players):
+        p = classes[i % len(classes)](port, channel=i % 16)
+        p.rng = rng
+        p.set_scale(SCALE)
+        p.active = True
+        engine.add_player(p)
+    return engine, port
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    i = min(len(sorted_values)-1, int(round(q / 100 * (len(sorted_values)-1))))
+    return sorted_values[i]
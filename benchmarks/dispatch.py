@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Action dispatch microbenchmark
+
+    Compares ticks per second of every class in PLAYERS with the
+    precompiled action table against the former eval() based dispatch.
+
+    Usage (from the repository root):
+        python -O -m benchmarks.dispatch
+"""
+
+from __future__ import division, print_function
+import random
+import time
+
+from players import PLAYERS
+from benchmarks.common import NullPort, SCALE
+
+
+class EvalActions(object):
+    """ Stand-in for a player's action table, resolving actions with eval
+        like tick() used to do
+    """
+
+    def __init__(self, player):
+        self.player = player
+
+    def __getitem__(self, i):
+        return eval("self.player.f{}".format(i))
+
+    def __len__(self):
+        return len(self.player.action_names())
+
+
+def ticks_per_second(P, use_eval, n_ticks):
+    random.seed(0)
+    p = P(NullPort())
+    p.set_scale(SCALE)
+    p.active = True
+    if use_eval:
+        p._actions = EvalActions(p)
+    rand = [(random.random(), random.random(), random.random())
+            for _ in range(n_ticks)]
+    t0 = time.perf_counter()
+    for r in rand:
+        p.tick(*r)
+    return n_ticks / (time.perf_counter() - t0)
+
+
+def main(n_ticks=200000):
+    print("{:<14}{:>14}{:>14}{:>9}".format("player", "eval (t/s)",
+                                          "table (t/s)", "speedup"))
+    for P in PLAYERS:
+        before = ticks_per_second(P, True, n_ticks)
+        after = ticks_per_second(P, False, n_ticks)
+        print("{:<14}{:>14.0f}{:>14.0f}{:>8.2f}x".format(P.__name__,
+              before, after, after/before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Tick throughput, message rate and tick latency benchmarks
+
+    Drives every class in PLAYERS alone, then mixed ensembles of 1, 10,
+    100 and 1000 players, against a null MIDI sink. Tracing (see
+    tracing.py) is off, as by default.
+
+    Usage (from the repository root):
+        python -O -m benchmarks.run -o results.json
+
+    Reported per case:
+        ticks_per_s     engine ticks per second
+        messages_per_s  MIDI messages per second
+        blocks_per_tick net growth of allocated memory blocks per tick
+                        (memory kept: leaks, growing caches)
+        alloc_bytes     mean peak of the memory allocated while a tick runs,
+                        temporaries freed by its end included (tracemalloc,
+                        in a separate run: tracing slows ticks down)
+        p50_ms, p99_ms  tick duration percentiles
+        max_players     players fitting in one tick at 480 BPM (31.25 ms),
+                        extrapolated from p99
+"""
+
+from __future__ import division, print_function
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from array import array
+
+from players import PLAYERS, TICKS_PER_BEAT
+from benchmarks.common import make_engine, percentile
+
+
+BUDGET_MS = 60000 / 480 / TICKS_PER_BEAT
+
+
+def bench(classes, n_players, n_ticks, seed=0):
+    engine, port = make_engine(classes, n_players, seed)
+    engine.run(min(n_ticks, 100))   # Warm up caches
+    port.count = 0
+    # Preallocated, so that the loop itself allocates no block
+    durations = array('q', bytes(8 * n_ticks))
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    t0 = time.perf_counter_ns()
+    for i in range(n_ticks):
+        t = time.perf_counter_ns()
+        engine.tick()
+        durations[i] = time.perf_counter_ns() - t
+    elapsed = (time.perf_counter_ns() - t0) / 1e9
+    blocks = sys.getallocatedblocks() - blocks
+    durations = sorted(durations)
+    p99_ms = percentile(durations, 99) / 1e6
+    return {
+        'players': [P.__name__ for P in classes],
+        'n_players': n_players,
+        'ticks': n_ticks,
+        'ticks_per_s': n_ticks / elapsed,
+        'messages_per_s': port.count / elapsed,
+        'blocks_per_tick': blocks / n_ticks,
+        'alloc_bytes': alloc_per_tick(classes, n_players, min(n_ticks, 500),
+                                      seed),
+        'p50_ms': percentile(durations, 50) / 1e6,
+        'p99_ms': p99_ms,
+        'max_players': int(BUDGET_MS / p99_ms * n_players) if p99_ms else None,
+    }
+
+
+def alloc_per_tick(classes, n_players, n_ticks, seed=0):
+    """ Mean peak of the bytes allocated during a tick, under tracemalloc """
+    engine, port = make_engine(classes, n_players, seed)
+    engine.run(min(n_ticks, 100))
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(n_ticks):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            engine.tick()
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / n_ticks
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-o', '--output', help="JSON file to write")
+    parser.add_argument('-t', '--ticks', type=int, default=2000)
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=[1, 10, 100, 1000])
+    args = parser.parse_args(argv)
+
+    cases = [([P], 1) for P in PLAYERS]
+    cases += [(PLAYERS, n) for n in args.sizes]
+    results = []
+    print("{:<28}{:>12}{:>12}{:>10}{:>10}{:>10}{:>10}{:>9}".format("case",
+          "ticks/s", "msgs/s", "blk/tick", "B/tick", "p50 ms", "p99 ms",
+          "fit"))
+    for classes, n in cases:
+        # Fewer ticks for big ensembles, keeping runs short
+        n_ticks = max(100, args.ticks // max(1, n // 10))
+        r = bench(classes, n, n_ticks)
+        results.append(r)
+        name = classes[0].__name__ if len(classes) == 1 else 'mixed'
+        print("{:<28}{:>12.0f}{:>12.0f}{:>10.2f}{:>10.0f}{:>10.3f}{:>10.3f}"
+              "{:>9}".format("{} x{}".format(name, n), r['ticks_per_s'],
+              r['messages_per_s'], r['blocks_per_tick'], r['alloc_bytes'],
+              r['p50_ms'], r['p99_ms'], r['max_players']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'machine': platform.platform(),
+                'optimized': not __debug__,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'tick_budget_ms': BUDGET_MS,
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
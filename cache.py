@@ -0,0 +1,195 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Content-addressed on-disk cache of renderings
+
+    A rendering is fully determined by its player specs, length, tempo and
+    seed, plus the code that generated it: the key hashes all of these, with
+    the specs resolved to the weight tables, scale notes and durations they
+    stand for. Values are the rendered tracks, packed compactly as plain
+    NumPy arrays (never unpickled, the directory being shared).
+"""
+
+from __future__ import division, print_function
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from players import PLAYER_CLASSES
+from scales import get_scale
+
+
+# Modules whose code changes what a rendering contains, or how it is stored
+CODE_MODULES = ('players', 'engine', 'rng', 'sampler', 'scales', 'messages',
+                'render', 'cache')
+
+_code_version = None
+
+
+def code_version():
+    """ Hash of the source of CODE_MODULES """
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in CODE_MODULES:
+            with open(os.path.join(here, name + '.py'), 'rb') as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def render_key(specs, n_ticks, seed, tempo):
+    """ Key of a rendering (see render.render_specs for the arguments) """
+    players = []
+    for spec in specs:
+        cls = PLAYER_CLASSES[spec['class']]
+        players.append({
+            'class': spec['class'],
+            'weights': spec.get('weights') or cls.default_weights,
+            'scale': list(get_scale(*spec['scale'])),
+            'durations': cls.durations,
+            'channel': spec.get('channel', 0),
+            'volume': spec.get('volume', 1),
+            'program': spec.get('program', 0),
+        })
+    content = json.dumps({'code': code_version(), 'players': players,
+                          'ticks': n_ticks, 'seed': seed, 'tempo': tempo},
+                         sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def pack_tracks(tracks):
+    """ Compact bytes of render_specs() output, as a compressed .npz
+
+        Per track i, the tick of each event (ticks_i), the message sizes
+        (sizes_i) and the messages joined (messages_i); the name, channel
+        and program of the tracks in names, channels and programs.
+    """
+    arrays = {'names': np.array([t.name for t, _ in tracks], str),
+              'channels': np.array([t.channel for t, _ in tracks], np.int64),
+              'programs': np.array([t.program for t, _ in tracks], np.int64)}
+    for i, (_, events) in enumerate(tracks):
+        arrays['ticks_{}'.format(i)] = np.array([t for t, _ in events],
+                                                np.int64)
+        arrays['sizes_{}'.format(i)] = np.array([len(m) for _, m in events],
+                                                np.uint8)
+        arrays['messages_{}'.format(i)] = np.frombuffer(
+            b''.join(m for _, m in events), np.uint8)
+    f = io.BytesIO()
+    np.savez_compressed(f, **arrays)
+    return f.getvalue()
+
+
+def unpack_tracks(data, track_type):
+    """ Tracks packed by pack_tracks, as (track_type(...), events)
+
+        Raises:
+            ValueError if data isn't a valid packing
+    """
+    try:
+        with np.load(io.BytesIO(data), allow_pickle=False) as packed:
+            tracks = []
+            for i, (name, channel, program) in enumerate(zip(
+                    packed['names'], packed['channels'], packed['programs'])):
+                ticks = packed['ticks_{}'.format(i)].tolist()
+                sizes = packed['sizes_{}'.format(i)].tolist()
+                messages = packed['messages_{}'.format(i)].tobytes()
+                events = []
+                j = 0
+                for tick, size in zip(ticks, sizes):
+                    events.append((tick, messages[j:j+size]))
+                    j += size
+                tracks.append((track_type(str(name), int(channel),
+                                          int(program)), events))
+    except (KeyError, OSError, zipfile.BadZipFile) as e:
+        raise ValueError("invalid packed tracks ({})".format(e))
+    return tracks
+
+
+class RenderCache(object):
+    """ Directory of values named after their key, evicted least recently
+        used first (by modification time, refreshed on every hit) when their
+        total size exceeds max_bytes
+
+        Values are written to a temporary file and renamed into place, so
+        several processes can share a cache. Each process only rescans the
+        directory once its own running total goes over the limit.
+
+        Args:
+            directory: where the values are stored (created if needed)
+            max_bytes: size limit of the stored values
+    """
+
+    suffix = '.bin'
+
+    def __init__(self, directory, max_bytes=512 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total = None  # Size of the stored values, as last seen
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key):
+        """ Stored value of key, or None """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        if self._total is None:
+            self.evict()
+        else:
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self.evict()
+
+    def entries(self):
+        """ (mtime, size, path) of every stored value """
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue    # Evicted by another process
+                yield st.st_mtime, st.st_size, path
+
+    def evict(self):
+        """ Remove the least recently used values beyond max_bytes """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._total = total
@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import time
+
+from players import TICKS_PER_BEAT
+
+
+class Clock(object):
+    """ Drift-free tick clock
+
+        Tick n is due at origin + n * period, where period is kept in
+        integer nanoseconds. Intervals are never accumulated, so neither the
+        rounding of the period nor the time spent in the tick callbacks
+        make the beat drift.
+
+        Args:
+            tempo: tempo in beats per minute
+            ticks_per_beat: resolution of the clock
+            max_late_ticks: when a tick is more than this number of periods
+                late, the clock gives up catching up and resynchronises
+                (the missed ticks are counted in self.skipped)
+    """
+
+    def __init__(self, tempo=120, ticks_per_beat=TICKS_PER_BEAT,
+                 max_late_ticks=4):
+        self.ticks_per_beat = ticks_per_beat
+        self.max_late_ticks = max_late_ticks
+        self.origin = time.perf_counter_ns()
+        self.n_tick = 0
+        self.period = 0
+        self.set_tempo(tempo)
+        self.reset_stats()
+
+    def set_tempo(self, tempo):
+        """ Change tempo without moving the next due tick """
+        assert(tempo > 0)
+        if self.period:
+            # Re-anchor on the next due tick so the change is seamless
+            self.origin = self.next_target()
+            self.n_tick = 0
+        self.tempo = tempo
+        self.period = int(round(60e9 / (tempo * self.ticks_per_beat)))
+
+    def start(self):
+        """ (Re)start the clock, first tick being due now """
+        self.origin = time.perf_counter_ns()
+        self.n_tick = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.skipped = 0
+        self.late_ticks = 0
+        self.last_lateness = 0
+        self.max_lateness = 0
+        self.total_lateness = 0
+
+    def next_target(self):
+        """ Absolute due time (perf_counter_ns) of the next tick """
+        return self.origin + self.n_tick * self.period
+
+    def time_until_next(self):
+        """ Nanoseconds until the next tick is due (negative when late) """
+        return self.next_target() - time.perf_counter_ns()
+
+    def ms_until_next(self):
+        """ Whole milliseconds until the next tick, for Tk's after() """
+        return max(0, self.time_until_next() // 1000000)
+
+    def advance(self):
+        """ Mark the next due tick as being processed now
+
+            Returns:
+                lateness of the tick in nanoseconds
+        """
+        now = time.perf_counter_ns()
+        lateness = now - self.next_target()
+        if lateness > self.max_late_ticks * self.period:
+            # Too late to catch up: skip missed ticks and resynchronise
+            missed = lateness // self.period
+            self.skipped += missed
+            self.n_tick += missed
+            lateness -= missed * self.period
+        self.n_tick += 1
+        self.ticks += 1
+        self.last_lateness = lateness
+        if lateness > 0:
+            self.late_ticks += 1
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+        return lateness
+
+    def sleep_until_next(self, spin=500000):
+        """ Block until the next tick is due
+
+            Sleeps coarsely, then busy-waits the last `spin` nanoseconds
+            to absorb the scheduler's wake-up granularity.
+        """
+        target = self.next_target()
+        remaining = target - time.perf_counter_ns()
+        if remaining > spin:
+            time.sleep((remaining - spin) / 1e9)
+        while time.perf_counter_ns() < target:
+            pass
+
+    def stats(self):
+        """ Lateness report (times in milliseconds) """
+        return {
+            'ticks': self.ticks,
+            'late_ticks': self.late_ticks,
+            'skipped': self.skipped,
+            'last_lateness': self.last_lateness / 1e6,
+            'max_lateness': self.max_lateness / 1e6,
+            'mean_lateness': self.total_lateness / max(1, self.ticks) / 1e6,
+        }
@@ -0,0 +1,138 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import random
+from collections import deque
+
+from tracing import TRACER
+
+
+class Engine(object):
+    """ Drives a set of players, one tick at a time
+
+        Holds no reference to any GUI or timing source: whoever owns the
+        engine (Tk main window, offline renderer...) decides when to call
+        tick().
+
+        Players are only ticked when due: after each call to tick(), a
+        player counting down wait_nticks is filed under the absolute tick
+        at which its countdown ends, and the decrements it skipped are
+        applied when it wakes up. Output is the same as ticking every
+        player on every tick. Players whose class sets `every_tick` are
+        ticked unconditionally.
+
+        Args:
+            players: initial list of players
+            rng: random source for the per-tick values (`random` module or
+                 any object with the same API, like rng.BlockRNG)
+    """
+
+    def __init__(self, players=None, rng=random):
+        self.rng = rng
+        self.players = []
+        self.n_tick = 0
+        self._wheel = {}    # absolute tick -> players due at that tick
+        self._due = {}      # player -> tick it is filed under
+        self._last = {}     # player -> last tick it was ticked at
+        self._rank = {}     # player -> position in self.players
+        self.journal = None
+        for p in players or []:
+            self.add_player(p)
+
+    def add_player(self, player):
+        self._rank[player] = len(self.players)
+        self.players.append(player)
+        self._last[player] = self.n_tick - 1
+        self._schedule(player, self.n_tick)
+
+    def remove_player(self, player):
+        self.players.remove(player)
+        del self._due[player]
+        del self._last[player]
+        self._rank = dict((p, i) for i, p in enumerate(self.players))
+
+    def start_journal(self):
+        """ Record the players' state before each tick, for rollback() """
+        self.journal = deque()
+
+    def rollback(self, tick):
+        """ Undo every tick from `tick` on, restoring the players' state
+
+            Only changes made by the players' tick() are undone. Random
+            sources are rewound too, so with the same players the undone
+            ticks are computed again identically.
+        """
+        assert(self.journal is not None)
+        assert(not self.journal or tick >= self.journal[0][0])
+        while self.journal and self.journal[-1][0] >= tick:
+            _, rng_state, entry = self.journal.pop()
+            for p, state, last, due in reversed(entry):
+                if p not in self._rank:
+                    continue    # Removed since
+                p.set_state(state)
+                self._last[p] = last
+                del self._due[p]
+                self._schedule(p, due)
+            self.rng.setstate(rng_state)
+        self.n_tick = tick
+
+    def forget(self, tick):
+        """ Drop journal entries of ticks before `tick` (never rolled back)
+        """
+        while self.journal and self.journal[0][0] < tick:
+            self.journal.popleft()
+
+    def wake(self, player):
+        """ Tick player at the next tick, after its wait_nticks was changed
+            from outside the player's own tick()
+
+            The new countdown starts from there: the decrements skipped
+            since the player was last ticked are forgotten.
+        """
+        self._last[player] = self.n_tick - 1
+        self._schedule(player, self.n_tick)
+
+    def _schedule(self, player, tick):
+        if self._due.get(player) == tick:
+            return
+        self._due[player] = tick
+        try:
+            self._wheel[tick].append(player)
+        except KeyError:
+            self._wheel[tick] = [player]
+
+    def tick(self):
+        if self.journal is not None:
+            entry = []
+            self.journal.append((self.n_tick, self.rng.getstate(), entry))
+        r1 = self.rng.random()
+        r2 = self.rng.random()
+        r3 = self.rng.random()
+
+        now = self.n_tick
+        TRACER.tick = now
+        due = self._wheel.pop(now, None)
+        if due:
+            if len(due) > 1:
+                # Drop removed/rescheduled entries, keep the players' order
+                due = [p for p in due if self._due.get(p) == now]
+                due.sort(key=self._rank.get)
+            for p in due:
+                if self._due.get(p) != now:
+                    continue
+                if self.journal is not None:
+                    entry.append((p, p.get_state(), self._last[p], now))
+                # Decrements the countdown would have done meanwhile
+                p.wait_nticks -= now - self._last[p] - 1
+                p.tick(r1, r2, r3)
+                self._last[p] = now
+                if p.every_tick or p.wait_nticks <= 0:
+                    self._schedule(p, now + 1)
+                else:
+                    self._schedule(p, now + 1 + p.wait_nticks)
+        self.n_tick += 1
+
+    def run(self, n_ticks):
+        for _ in range(n_ticks):
+            self.tick()
@@ -0,0 +1,245 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Struct-of-arrays engine for thousands of concurrent voices
+
+    Voices behave like Basic, Soloist and Chaotic players, but their state
+    lives in NumPy arrays (one row per voice) and every voice is advanced by
+    a single vectorized step per tick. Unlike players sharing an Engine,
+    each voice draws its own uniforms, so voices of the same kind don't
+    move in lockstep.
+"""
+
+from __future__ import division, print_function
+import numpy as np
+
+from players import StochaPlayer, Basic, Soloist, Chaotic
+from sampler import check_weights
+from messages import MESSAGES, raw_sender
+
+
+# Voice kinds
+BASIC = 0
+SOLOIST = 1
+CHAOTIC = 2
+
+KIND_CLASSES = {BASIC: Basic, SOLOIST: Soloist, CHAOTIC: Chaotic}
+
+MAX_NOTES = 3   # Notes per chord
+
+EVENT_DTYPE = np.dtype([('voice', np.int32),
+                        ('status', np.uint8),
+                        ('note', np.uint8),
+                        ('velocity', np.uint8)])
+
+
+def cumulative_matrix(tables, width):
+    """ Normalised cumulative rows, padded with 1.0 up to width """
+    cum = np.ones((len(tables), width))
+    for i, table in enumerate(tables):
+        check_weights(table)
+        c = np.cumsum(table, dtype=float)
+        cum[i, :len(c)] = c / c[-1]
+    return cum
+
+
+def draw(cum, u):
+    """ Row-wise weighted indices: first column whose boundary exceeds u """
+    return np.minimum((cum <= u[:, None]).sum(axis=1), cum.shape[1] - 1)
+
+
+class Ensemble(object):
+    """ Many stochastic voices advanced together
+
+        Args:
+            scale: list of midi notes shared by every voice
+            seed: seed of the ensemble's random generator
+    """
+
+    _columns = ('kind', 'channel', 'active', 'volume', 'wait', 'index',
+                'direction', 'notes', 'durations', 'cum_f', 'cum_s', 'cum_d')
+
+    def __init__(self, scale, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.set_scale(scale)
+        self.n_tick = 0
+        self.n = 0
+        n_dur = len(StochaPlayer.durations)
+        self.kind = np.zeros(0, np.int8)
+        self.channel = np.zeros(0, np.uint8)
+        self.active = np.zeros(0, bool)
+        self.volume = np.zeros(0)
+        self.wait = np.zeros(0, np.int32)
+        self.index = np.zeros(0, np.int32)
+        self.direction = np.zeros(0, np.int32)
+        self.notes = np.zeros((0, MAX_NOTES), np.int16)   # -1: no note
+        self.durations = np.zeros((0, n_dur), np.int32)
+        self.cum_f = np.zeros((0, 5))
+        self.cum_s = np.zeros((0, n_dur))
+        self.cum_d = np.zeros((0, n_dur))
+
+    def set_scale(self, scale):
+        self.scale = np.array(sorted(scale), np.int16)
+
+    def add_voices(self, kind, n, channel=0, volume=1.0, weights=None,
+                   durations=None):
+        """ Append n voices of a kind
+
+            Args:
+                kind: BASIC, SOLOIST or CHAOTIC
+                weights: function, silence and note durations tables
+                         (defaults to those of the matching player class)
+                durations: duration values in ticks (e.g. Pad's, 4x longer)
+
+            Returns:
+                indices of the new voices
+        """
+        cls = KIND_CLASSES[kind]
+        weights = weights or cls.default_weights
+        if len(weights[0]) != len(cls.action_names()):
+            raise ValueError("{} voices take {} function weights".format(
+                cls.__name__, len(cls.action_names())))
+        durations = durations or cls.durations
+        new = {
+            'kind': np.full(n, kind, np.int8),
+            'channel': np.full(n, channel, np.uint8),
+            'active': np.ones(n, bool),
+            'volume': np.full(n, volume),
+            'wait': np.zeros(n, np.int32),
+            'index': np.zeros(n, np.int32),
+            'direction': np.ones(n, np.int32),
+            'notes': np.full((n, MAX_NOTES), -1, np.int16),
+            'durations': np.tile(np.array(durations, np.int32), (n, 1)),
+            'cum_f': np.tile(cumulative_matrix([weights[0]], 5), (n, 1)),
+            'cum_s': np.tile(cumulative_matrix([weights[1]],
+                                               len(durations)), (n, 1)),
+            'cum_d': np.tile(cumulative_matrix([weights[2]],
+                                               len(durations)), (n, 1)),
+        }
+        for name in self._columns:
+            setattr(self, name, np.concatenate([getattr(self, name),
+                                                new[name]]))
+        first = self.n
+        self.n += n
+        return np.arange(first, self.n)
+
+    def step(self):
+        """ Advance every voice by one tick
+
+            Returns:
+                structured array of events (EVENT_DTYPE), note_offs first
+        """
+        waiting = self.wait > 0
+        self.wait[waiting] -= 1
+        ready = np.flatnonzero(~waiting)
+
+        # Release the notes of voices whose wait is over
+        held = self.notes[ready]
+        off_voice, off_col = np.nonzero(held >= 0)
+        offs = np.zeros(len(off_voice), EVENT_DTYPE)
+        offs['voice'] = ready[off_voice]
+        offs['status'] = 0x80 | self.channel[offs['voice']]
+        offs['note'] = held[off_voice, off_col]
+        self.notes[ready] = -1
+
+        v = ready[self.active[ready]]
+        self.n_tick += 1
+        if len(v) == 0:
+            return offs
+        u = self.rng.random((len(v), 4))
+        f = draw(self.cum_f[v], u[:, 0])
+        kind = self.kind[v]
+        L = len(self.scale)
+        degrees = np.full((len(v), MAX_NOTES), -1, np.int64)
+        first = (u[:, 1] * L).astype(np.int64)
+
+        # Basic: f1 single note, f2 two notes, f3 triad
+        b = kind == BASIC
+        m = b & (f >= 1)
+        degrees[m, 0] = first[m]
+        m = b & (f == 2)
+        degrees[m, 1] = (u[m, 2] * L).astype(np.int64)
+        m = b & (f == 3)
+        degrees[m, 1] = (first[m] + 2) % L
+        degrees[m, 2] = (first[m] + 4) % L
+
+        # Soloist: f1 jump, f2/f3 one or two steps, f4 turn around and step
+        s = kind == SOLOIST
+        m = s & (f == 4)
+        self.direction[v[m]] *= -1
+        idx = self.index[v]
+        step = np.where((f == 2) | (f == 4), 1, np.where(f == 3, 2, 0))
+        idx = np.where(s & (f == 1), first,
+                       (idx + step * self.direction[v]) % L)
+        m = s & (f >= 1)
+        self.index[v[m]] = idx[m]
+        degrees[m, 0] = idx[m]
+
+        # Chaotic: f1..f3 play 1 to 3 distinct random notes
+        c = np.flatnonzero((kind == CHAOTIC) & (f >= 1))
+        if len(c):
+            picks = self.rng.random((len(c), L)).argsort(axis=1)
+            for k in range(min(MAX_NOTES, L)):
+                sel = f[c] > k
+                degrees[c[sel], k] = picks[sel, k]
+
+        # Durations: silence table for f0, note table otherwise
+        silent = f == 0
+        dur_i = np.where(silent, draw(self.cum_s[v], u[:, 3]),
+                         draw(self.cum_d[v], u[:, 3]))
+        self.wait[v] = self.durations[v, dur_i] - 1
+
+        playing = degrees >= 0
+        notes = np.where(playing, self.scale[np.maximum(degrees, 0)], -1)
+        self.notes[v] = notes
+        vel = self.volume[v] * self.rng.normal(64, 16, len(v))
+        vel = np.clip(vel.astype(np.int64), 1, 127)
+        on_voice, on_col = np.nonzero(playing)
+        ons = np.zeros(len(on_voice), EVENT_DTYPE)
+        ons['voice'] = v[on_voice]
+        ons['status'] = 0x90 | self.channel[ons['voice']]
+        ons['note'] = notes[on_voice, on_col]
+        ons['velocity'] = vel[on_voice]
+        return np.concatenate([offs, ons])
+
+    def run(self, n_ticks):
+        """ Step n_ticks times
+
+            Returns:
+                (ticks, events): tick of each event and the events
+        """
+        ticks = []
+        events = []
+        for _ in range(n_ticks):
+            tick = self.n_tick
+            ev = self.step()
+            if len(ev):
+                ticks.append(np.full(len(ev), tick, np.int64))
+                events.append(ev)
+        if not events:
+            return np.zeros(0, np.int64), np.zeros(0, EVENT_DTYPE)
+        return np.concatenate(ticks), np.concatenate(events)
+
+
+def encode(events):
+    """ Raw 3-byte MIDI messages of an event array, concatenated """
+    raw = np.empty((len(events), 3), np.uint8)
+    raw[:, 0] = events['status']
+    raw[:, 1] = events['note']
+    raw[:, 2] = events['velocity']
+    return raw.tobytes()
+
+
+def send_events(events, port):
+    """ Send an event array to a port, as raw bytes when supported """
+    send_raw = raw_sender(port)
+    data = encode(events)
+    for i in range(0, len(data), 3):
+        if send_raw:
+            send_raw(data[i:i+3])
+        else:
+            status = data[i]
+            type = 'note_on' if status & 0xF0 == 0x90 else 'note_off'
+            port.send(MESSAGES.message(type, status & 0x0F, data[i+1],
+                                       data[i+2]))
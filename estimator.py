@@ -0,0 +1,138 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Analytical load estimates from the weight tables, without rendering
+
+    Every action a player runs starts a cycle lasting the duration it
+    draws, at the end of which the next action is drawn: the cycles are
+    independent and identically distributed, so the player is a
+    renewal-reward process. Over time t, the number of notes N(t) has mean
+    rate * t and variance ~ var_rate * t, with
+
+        rate     = E[R] / E[L]
+        var_rate = E[(R - rate * L)^2] / E[L]
+
+    for R the reward (notes, bytes...) and L the length of a cycle. Actions
+    are described by the class's action_profile.
+
+    Assumptions: every note_on is paired with a single note_off.
+    Ensembles are summed as independent players, whereas players sharing
+    an engine draw the same values each tick; identical players are thus
+    correlated and their real variance is larger. BasicLooper's state
+    changes, which cut notes at the end of measures, are ignored.
+"""
+
+from __future__ import division, print_function
+
+from players import TICKS_PER_BEAT
+
+
+# A MIDI 1.0 DIN link: 31250 baud, 10 bits per byte
+DIN_BYTES_PER_S = 31250 / 10
+
+# Bytes of a note_on or note_off, without running status
+NOTE_MESSAGE_BYTES = 3
+
+# Normal quantile used for the peak loads (99th percentile)
+Z_99 = 2.326
+
+
+def moments(weights, values):
+    """ Mean and mean square of values drawn with weights """
+    total = sum(weights)
+    m1 = sum(w * v for w, v in zip(weights, values)) / total
+    m2 = sum(w * v * v for w, v in zip(weights, values)) / total
+    return m1, m2
+
+
+def renewal(cycles, reward):
+    """ Rate and variance rate (per tick) of a reward over cycles
+
+        Args:
+            cycles: (probability, notes, E[L], E[L^2]) per action
+            reward: function of the notes of an action
+    """
+    EL = sum(p * m1 for p, n, m1, m2 in cycles)
+    ER = sum(p * reward(n) for p, n, m1, m2 in cycles)
+    rate = ER / EL
+    # E[(R - rate L)^2], R being fixed for a given action
+    dev = sum(p * (reward(n)**2 - 2 * rate * reward(n) * m1 + rate**2 * m2)
+              for p, n, m1, m2 in cycles)
+    return rate, dev / EL
+
+
+def estimate(player, tempo=120, weights=None):
+    """ Expected load of a player
+
+        Args:
+            player: a player (its class must define action_profile)
+            tempo: tempo in beats per minute
+            weights: weight tables to use instead of the player's
+
+        Returns:
+            dict of notes_per_s, messages_per_s, bytes_per_s (means),
+            notes_var and bytes_var (variance rates: the count over t
+            seconds has variance ~ var * t), polyphony and polyphony_var
+            (notes sounding at any time) and actions_per_s
+    """
+    weights = weights or player.weights
+    functions = weights[0]
+    total = sum(functions)
+    cycles = []
+    sounding = []   # Notes sounding at once during each action
+    for w, (notes, table, ticks) in zip(functions, player.action_profile):
+        if table is None:
+            m1 = max(notes, 1) * ticks
+            m2 = m1 * m1
+            sounding.append(min(notes, 1))
+        else:
+            m1, m2 = moments(weights[table], player.durations)
+            sounding.append(notes)
+        cycles.append((w / total, notes, m1, m2))
+
+    EL = sum(p * m1 for p, n, m1, m2 in cycles)
+    poly = sum(p * s * m1 for (p, n, m1, m2), s in zip(cycles, sounding)) / EL
+    poly2 = sum(p * s * s * m1
+                for (p, n, m1, m2), s in zip(cycles, sounding)) / EL
+    note_rate, note_var = renewal(cycles, lambda n: n)
+    msg_rate, msg_var = renewal(cycles, lambda n: 2 * n)
+
+    ticks_per_s = tempo * TICKS_PER_BEAT / 60
+    f = player.playing_fraction(weights)
+    b = NOTE_MESSAGE_BYTES
+    return {
+        'notes_per_s': f * note_rate * ticks_per_s,
+        'notes_var': f * note_var * ticks_per_s,
+        'messages_per_s': f * msg_rate * ticks_per_s,
+        'bytes_per_s': f * b * msg_rate * ticks_per_s,
+        'bytes_var': f * b * b * msg_var * ticks_per_s,
+        'polyphony': f * poly,
+        'polyphony_var': f * poly2 - (f * poly)**2,
+        'actions_per_s': f * ticks_per_s / EL,
+    }
+
+
+def ensemble_estimate(players, tempo=120):
+    """ Sum of the estimates of players, taken as independent """
+    total = dict.fromkeys(['notes_per_s', 'notes_var', 'messages_per_s',
+                           'bytes_per_s', 'bytes_var', 'polyphony',
+                           'polyphony_var', 'actions_per_s'], 0)
+    for p in players:
+        for k, v in estimate(p, tempo).items():
+            total[k] += v
+    return total
+
+
+def peak(mean_per_s, var_per_s, window_s=1.0, z=Z_99):
+    """ Upper quantile of a rate measured over a window (normal approx.) """
+    return mean_per_s + z * (var_per_s / window_s)**0.5
+
+
+def din_load(est, window_s=1.0):
+    """ Share of a DIN link's bandwidth used: (mean, 99th percentile over
+        windows of window_s seconds)
+    """
+    return (est['bytes_per_s'] / DIN_BYTES_PER_S,
+            peak(est['bytes_per_s'], est['bytes_var'], window_s)
+            / DIN_BYTES_PER_S)
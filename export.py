@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Columnar export of renderings, for bulk analysis
+
+    Notes are paired from the note_on/note_off events of render() output
+    into a NumPy structured array (NOTE_DTYPE), saved as .npy so analysis
+    jobs can memory-map it. A piano-roll (which pitches sound at each tick)
+    is derived from it in a sparse row-compressed form: for tick t, the
+    sounding pitches are indices[indptr[t]:indptr[t+1]].
+"""
+
+from __future__ import division, print_function
+from collections import deque
+
+import numpy as np
+
+from players import TICKS_PER_BEAT
+
+
+NOTE_DTYPE = np.dtype([('onset', np.int64),
+                       ('duration', np.int32),
+                       ('channel', np.uint8),
+                       ('pitch', np.uint8),
+                       ('velocity', np.uint8),
+                       ('player', np.uint16)])
+
+
+def note_array(tracks, n_ticks):
+    """ Notes of a rendering, sorted by onset
+
+        A note_off ends the oldest note of its channel and pitch still
+        sounding; notes never ended last until n_ticks.
+
+        Args:
+            tracks: list of (player, events), as returned by render(); the
+                    player id of a note is the index of its track
+            n_ticks: length of the rendering
+    """
+    notes = []
+    for player_id, (_, events) in enumerate(tracks):
+        sounding = {}   # (channel, pitch) -> queue of index in notes
+        for tick, data in events:
+            kind = data[0] & 0xF0
+            if kind == 0x90 and data[2] > 0:
+                key = (data[0] & 0x0F, data[1])
+                sounding.setdefault(key, deque()).append(len(notes))
+                notes.append([tick, -1, key[0], key[1], data[2], player_id])
+            elif kind == 0x80 or kind == 0x90:
+                queue = sounding.get((data[0] & 0x0F, data[1]))
+                if queue:
+                    note = notes[queue.popleft()]
+                    note[1] = tick - note[0]
+        for queue in sounding.values():
+            for i in queue:
+                notes[i][1] = n_ticks - notes[i][0]
+    array = np.array([tuple(n) for n in notes], dtype=NOTE_DTYPE)
+    return array[np.argsort(array['onset'], kind='stable')]
+
+
+def piano_roll(notes, n_ticks):
+    """ Sparse piano-roll of notes (all channels together)
+
+        Returns:
+            (indptr, indices): pitches sounding at tick t are
+            indices[indptr[t]:indptr[t+1]], in ascending order
+    """
+    durations = np.maximum(notes['duration'].astype(np.int64), 0)
+    ticks = (np.repeat(notes['onset'], durations) +
+             np.arange(durations.sum()) -
+             np.repeat(np.cumsum(durations) - durations, durations))
+    pitches = np.repeat(notes['pitch'], durations)
+    keep = ticks < n_ticks
+    # One cell per (tick, pitch), however many notes share it
+    cells = np.unique(ticks[keep] * 128 + pitches[keep])
+    indices = (cells % 128).astype(np.uint8)
+    indptr = np.searchsorted(cells // 128, np.arange(n_ticks + 1))
+    return indptr, indices
+
+
+def dense_roll(indptr, indices):
+    """ Boolean (ticks, 128) matrix of a sparse piano-roll """
+    n_ticks = len(indptr) - 1
+    roll = np.zeros((n_ticks, 128), bool)
+    rows = np.repeat(np.arange(n_ticks), np.diff(indptr))
+    roll[rows, indices] = True
+    return roll
+
+
+def save_notes(notes, filename):
+    """ Save a note array as .npy (see load_notes) """
+    np.save(filename, notes)
+
+
+def load_notes(filename):
+    """ Memory-mapped note array: nothing is read until it is used """
+    return np.load(filename, mmap_mode='r')
+
+
+def save_roll(notes, n_ticks, filename, tempo=120):
+    """ Save the notes and their sparse piano-roll in an uncompressed .npz
+        (along with tempo and ticks_per_beat)
+    """
+    indptr, indices = piano_roll(notes, n_ticks)
+    np.savez(filename, notes=notes, indptr=indptr, indices=indices,
+             tempo=tempo, ticks_per_beat=TICKS_PER_BEAT)
@@ -0,0 +1,243 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Bandwidth governor: keeps a port's output within a byte budget
+
+    A MIDI 1.0 DIN link carries about 3125 bytes/s, a thousand 3-byte
+    messages. Bursts of chords on one port over that rate come out smeared.
+    The governor counts the bytes sent over a sliding time window and, when
+    a burst would go over the budget, thins it with its policy: delay
+    program changes, collapse chords, drop note_ons of the channels of
+    lowest priority. Note_offs (and any other message) are never dropped,
+    so no note can get stuck; a burst of them alone may go over the budget,
+    which is counted as an overrun.
+
+    Ports streaming raw bytes (those with a true `running_status`
+    attribute, whose send_bytes() takes any number of messages at once) get
+    each burst encoded with running status: note_offs become note_ons of
+    velocity 0 and the status byte is only sent when it changes. No port
+    shipped here sets it (rtmidi and the loopback take whole messages), so
+    this path is only reached with ports of your own.
+"""
+
+from __future__ import division, print_function
+from collections import deque
+
+from estimator import DIN_BYTES_PER_S
+
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+
+# Steps of the policy, in the order they are tried by default
+DELAY = 'delay'         # Hold program changes until there is room
+COLLAPSE = 'collapse'   # Keep the first note of each chord
+DROP = 'drop'           # Drop note_ons, lowest priority channels first
+POLICY = (DELAY, COLLAPSE, DROP)
+
+
+def is_note_on(data):
+    return data[0] & 0xF0 == NOTE_ON and data[2] > 0
+
+
+def is_program_change(data):
+    return data[0] & 0xF0 == PROGRAM_CHANGE
+
+
+class BandwidthGovernor(object):
+    """ Byte budget of one output port
+
+        Args:
+            bytes_per_s: budget (default: a DIN link)
+            window: length of the sliding window the budget applies to,
+                    in seconds
+            priorities: channel -> priority; note_ons of the channels of
+                        lowest priority are dropped first (default 0)
+            policy: steps tried, in order, while a burst is over budget
+            running_status: encode with running status when the port
+                            allows it (none of the shipped ports do)
+    """
+
+    def __init__(self, bytes_per_s=DIN_BYTES_PER_S, window=0.1,
+                 priorities=None, policy=POLICY, running_status=True):
+        self.window = int(window * 1e9)
+        self.budget = int(bytes_per_s * window)
+        self.priorities = dict(priorities or {})
+        self.policy = tuple(policy)
+        self.running_status = running_status
+        self._sent = deque()    # (perf_counter_ns, bytes) of the window
+        self._used = 0
+        self._status = None     # Running status of the port
+        self._delayed = {}      # channel -> program change held back
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        self.bytes = 0
+        self.messages = 0
+        self.throttled = 0
+        self.delayed = 0
+        self.collapsed = 0
+        self.dropped = 0
+        self.overruns = 0
+        self.saved = 0
+        self.max_used = 0
+
+    def metrics(self):
+        """ Throttling counters
+
+            throttled: bursts over budget; delayed: program changes held
+            back (again at each burst they miss); collapsed, dropped:
+            note_ons removed; overruns: bursts still over budget; saved:
+            bytes spared by running status
+        """
+        return {
+            'bytes': self.bytes,
+            'messages': self.messages,
+            'throttled': self.throttled,
+            'delayed': self.delayed,
+            'collapsed': self.collapsed,
+            'dropped': self.dropped,
+            'overruns': self.overruns,
+            'saved': self.saved,
+            'pending': len(self._delayed),
+            'max_window_bytes': self.max_used,
+            'budget': self.budget,
+        }
+
+    def reset_status(self):
+        """ Forget the running status (new port, or one shared with others) """
+        self._status = None
+
+    def size(self, batch, running=False):
+        """ Bytes batch takes on the wire, after the current status """
+        n = 0
+        status = self._status
+        for data in batch:
+            n += len(data)
+            if not running:
+                continue
+            if data[0] < 0xF0:
+                # As encode() does it
+                if data[0] & 0xF0 == NOTE_OFF:
+                    data = bytes((data[0] | 0x10, data[1], 0))
+                if data[0] == status:
+                    n -= 1
+                status = data[0]
+            elif data[0] < 0xF8:
+                status = None
+        return n
+
+    def encode(self, batch):
+        """ Batch as one byte string, with running status """
+        out = bytearray()
+        status = self._status
+        for data in batch:
+            if data[0] < 0xF0:
+                if data[0] & 0xF0 == NOTE_OFF:
+                    data = bytes((data[0] | 0x10, data[1], 0))
+                out += data[1:] if data[0] == status else data
+                status = data[0]
+            else:
+                out += data
+                if data[0] < 0xF8:  # System common messages cancel it
+                    status = None
+        self._status = status
+        return bytes(out)
+
+    def available(self, now):
+        """ Bytes left in the window ending at now (perf_counter_ns) """
+        sent = self._sent
+        while sent and sent[0][0] <= now - self.window:
+            self._used -= sent.popleft()[1]
+        return self.budget - self._used
+
+    def filter(self, batch, now, running=False):
+        """ Messages of a burst to send now, within the budget if possible
+
+            Program changes delayed earlier are sent first once there is
+            room again.
+
+            Args:
+                batch: list of message bytes, note_offs first
+                now: perf_counter_ns time of the burst
+                running: whether the burst will be sent with running status
+
+            Returns:
+                list of message bytes
+        """
+        if self._delayed:
+            batch = list(self._delayed.values()) + batch
+            self._delayed.clear()
+        room = self.available(now)
+        if self.size(batch, running) > room:
+            self.throttled += 1
+            for step in self.policy:
+                batch = getattr(self, '_' + step)(batch, room, running)
+                if self.size(batch, running) <= room:
+                    break
+            else:
+                self.overruns += 1
+        n = self.size(batch, running)
+        if n:
+            self._sent.append((now, n))
+            self._used += n
+            self.max_used = max(self.max_used, self._used)
+        self.bytes += n
+        self.messages += len(batch)
+        if running:
+            self.saved += sum(len(data) for data in batch) - n
+        return batch
+
+    def drain(self):
+        """ Take the program changes still held back (when closing) """
+        delayed = list(self._delayed.values())
+        self._delayed.clear()
+        return delayed
+
+    def _priority(self, data):
+        return self.priorities.get(data[0] & 0x0F, 0)
+
+    def _delay(self, batch, room, running):
+        kept = []
+        for data in batch:
+            if is_program_change(data):
+                # Only the last program of a channel matters
+                self._delayed[data[0] & 0x0F] = data
+                self.delayed += 1
+            else:
+                kept.append(data)
+        return kept
+
+    def _collapse(self, batch, room, running):
+        """ Chords of the lowest priority channels first """
+        chords = {}     # channel -> indices of its note_ons
+        for i, data in enumerate(batch):
+            if is_note_on(data):
+                chords.setdefault(data[0] & 0x0F, []).append(i)
+        removed = set()
+        for channel in sorted(chords, key=lambda c: self.priorities.get(c, 0)):
+            if len(chords[channel]) < 2:
+                continue
+            removed.update(chords[channel][1:])
+            self.collapsed += len(chords[channel]) - 1
+            kept = [d for i, d in enumerate(batch) if i not in removed]
+            if self.size(kept, running) <= room:
+                break
+        return [d for i, d in enumerate(batch) if i not in removed]
+
+    def _drop(self, batch, room, running):
+        """ Note_ons of the lowest priority, last ones first """
+        candidates = [i for i, data in enumerate(batch) if is_note_on(data)]
+        candidates.sort(key=lambda i: (self._priority(batch[i]), -i))
+        removed = set()
+        size = self.size(batch, running)
+        for i in candidates:
+            if size <= room:
+                break
+            removed.add(i)
+            self.dropped += 1
+            size = self.size([d for j, d in enumerate(batch)
+                              if j not in removed], running)
+        return [d for i, d in enumerate(batch) if i not in removed]
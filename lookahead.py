@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import time
+
+from players import TICKS_PER_BEAT
+
+
+class Lookahead(object):
+    """ Computes ticks a time window ahead of their due time
+
+        Each computed tick is flushed to the MidiWriter with its absolute
+        due time, and the writer thread releases it precisely when due, so
+        a late fill() (GC pause, Tk redraw...) doesn't move any note.
+
+        Changes to the players (weights, scale, tempo...) must go through
+        update() or set_tempo(): the ticks computed but not released yet are
+        discarded from the writer, the players are rolled back to the first
+        of those ticks and the ticks are computed again after the change.
+
+        Args:
+            engine: the Engine to drive (its journal gets started)
+            writer: started MidiWriter the players send to
+            tempo: tempo in beats per minute
+            window_ms: how far ahead ticks are computed
+            guard_ms: ticks due sooner than this are considered released
+    """
+
+    def __init__(self, engine, writer, tempo=120, window_ms=150, guard_ms=5,
+                 ticks_per_beat=TICKS_PER_BEAT):
+        self.engine = engine
+        self.writer = writer
+        self.window = int(window_ms * 1e6)
+        self.guard = int(guard_ms * 1e6)
+        self.ticks_per_beat = ticks_per_beat
+        self.period = int(round(60e9 / (tempo * ticks_per_beat)))
+        self.base_tick = engine.n_tick
+        self.base_time = time.perf_counter_ns()
+        self.invalidations = 0
+        self.resyncs = 0
+        engine.start_journal()
+
+    def due(self, tick):
+        """ perf_counter_ns time at which tick is due """
+        return self.base_time + (tick - self.base_tick) * self.period
+
+    def first_tick_after(self, t):
+        """ First tick due strictly after time t """
+        return self.base_tick + max(0, (t - self.base_time) // self.period + 1)
+
+    def fill(self):
+        """ Compute every tick due within the window; call it often """
+        now = time.perf_counter_ns()
+        engine = self.engine
+        if self.due(engine.n_tick) < now - self.window:
+            # Fell too far behind to catch up: restart from now
+            self.base_tick = engine.n_tick
+            self.base_time = now
+            self.resyncs += 1
+        horizon = now + self.window
+        while self.due(engine.n_tick) <= horizon:
+            due = self.due(engine.n_tick)
+            engine.tick()
+            self.writer.flush(due)
+        engine.forget(self.first_tick_after(now))
+
+    def invalidate(self):
+        """ Drop the ticks not released yet, to compute them again """
+        cutoff = time.perf_counter_ns() + self.guard
+        self.writer.discard(cutoff)
+        engine = self.engine
+        tick = self.first_tick_after(cutoff)
+        if engine.journal:
+            tick = max(tick, engine.journal[0][0])
+        if tick < engine.n_tick:
+            engine.rollback(tick)
+            self.invalidations += 1
+
+    def update(self, fn, *args):
+        """ Apply a change to the players, e.g.
+            lookahead.update(player.update_weights, weights)
+        """
+        self.invalidate()
+        return fn(*args)
+
+    def set_tempo(self, tempo):
+        self.invalidate()
+        # Re-anchor on the next tick to compute so the change is seamless
+        self.base_time = self.due(self.engine.n_tick)
+        self.base_tick = self.engine.n_tick
+        self.period = int(round(60e9 / (tempo * self.ticks_per_beat)))
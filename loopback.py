@@ -0,0 +1,138 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import sys
+import time
+from array import array
+
+import mido
+
+
+class LoopbackOutput(object):
+    """ Virtual MIDI output recording what it is sent
+
+        Stands in for a hardware port (players, MidiWriter...) on machines
+        without MIDI devices. Every message is stored with its
+        perf_counter_ns send time in preallocated ring buffers, so capturing
+        channel messages allocates nothing; once full, the oldest messages
+        are overwritten. Longer ones (sysex, several messages written at
+        once) are kept aside, by position in the ring.
+
+        When the sender knows when a message was meant to go out (see
+        MidiWriter), that due time is stored too and stats() reports the
+        latency and jitter of the output path.
+
+        Args:
+            capacity: number of messages kept
+    """
+
+    name = "Loopback (virtual)"
+    accepts_due = True  # send_bytes() takes the due time of the message
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self._data = bytearray(3 * capacity)
+        self._size = bytearray(capacity)
+        self._time = array('q', bytes(8 * capacity))
+        self._due = array('q', bytes(8 * capacity))
+        self._long = {}     # Ring position -> message over 3 bytes
+        self.count = 0      # Messages received since last reset
+        self.closed = False
+
+    def send(self, msg):
+        self.send_bytes(msg.bytes())
+
+    def send_bytes(self, data, due=-1):
+        """ Record a message
+
+            Args:
+                due: perf_counter_ns time the message was due (-1: unknown)
+        """
+        t = time.perf_counter_ns()
+        i = self.count % self.capacity
+        n = len(data)
+        if n > 3:
+            self._long[i] = bytes(data)
+            n = 0   # Size of the messages kept aside
+        else:
+            self._data[3*i:3*i+n] = data
+            if self._long:
+                self._long.pop(i, None)
+        self._size[i] = n
+        self._time[i] = t
+        self._due[i] = due
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+        self._long.clear()
+
+    def close(self):
+        self.closed = True
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def events(self):
+        """ Captured (send time, due time, bytes) triplets, oldest first """
+        start = self.count - len(self)
+        for k in range(start, self.count):
+            i = k % self.capacity
+            n = self._size[i]
+            data = bytes(self._data[3*i:3*i+n]) if n else self._long[i]
+            yield self._time[i], self._due[i], data
+
+    def stats(self):
+        """ Timing statistics of the captured stream (in milliseconds)
+
+            intervals: time between consecutive messages
+            latency: send time - due time, for messages with a due time
+            jitter: standard deviation of the latency
+        """
+        times = []
+        latencies = []
+        for t, due, data in self.events():
+            times.append(t)
+            if due >= 0:
+                latencies.append(t - due)
+        intervals = [b - a for a, b in zip(times, times[1:])]
+        stats = {'messages': len(times), 'overwritten': self.count - len(times)}
+        stats.update(summary('interval', intervals))
+        stats.update(summary('latency', latencies))
+        if latencies:
+            mean = sum(latencies) / len(latencies)
+            var = sum((l - mean)**2 for l in latencies) / len(latencies)
+            stats['jitter'] = var**0.5 / 1e6
+        return stats
+
+    def dump(self, file=sys.stdout):
+        """ Print the captured stream, times relative to the first message """
+        t0 = None
+        for t, due, data in self.events():
+            if t0 is None:
+                t0 = t
+            try:
+                msg = mido.Message.from_bytes(data)
+            except ValueError:
+                msg = "({} bytes)".format(len(data))  # Several messages
+            line = "{:12.3f} ms  {:<9} {}".format((t - t0) / 1e6, data.hex(),
+                                                 msg)
+            if due >= 0:
+                line += "  (late {:.3f} ms)".format((t - due) / 1e6)
+            print(line, file=file)
+
+
+def summary(name, values):
+    """ min/mean/p50/p99/max of nanosecond values, in milliseconds """
+    if not values:
+        return {}
+    values = sorted(values)
+    n = len(values)
+    return {
+        name + '_min': values[0] / 1e6,
+        name + '_mean': sum(values) / n / 1e6,
+        name + '_p50': values[n // 2] / 1e6,
+        name + '_p99': values[min(n-1, int(n * 0.99))] / 1e6,
+        name + '_max': values[-1] / 1e6,
+    }
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import mido
+
+
+STATUS = {'note_off': 0x80, 'note_on': 0x90}
+
+
+class MessageCache(object):
+    """ Interned channel messages
+
+        Messages are validated by mido once, the first time a
+        (type, channel, note, velocity) key is requested, and shared
+        afterwards: callers must never modify them (use msg.copy()).
+    """
+
+    def __init__(self):
+        self._messages = {}
+        self._bytes = {}
+
+    def message(self, type, channel, note, velocity=0):
+        key = (type, channel, note, velocity)
+        try:
+            return self._messages[key]
+        except KeyError:
+            msg = mido.Message(type, channel=channel, note=note,
+                               velocity=velocity)
+            self._messages[key] = msg
+            return msg
+
+    def bytes(self, type, channel, note, velocity=0):
+        """ Pre-encoded 3-byte form of a message """
+        key = (type, channel, note, velocity)
+        try:
+            return self._bytes[key]
+        except KeyError:
+            data = bytes(self.message(*key).bytes())
+            self._bytes[key] = data
+            return data
+
+    def clear(self):
+        self._messages.clear()
+        self._bytes.clear()
+
+
+# Shared by every player
+MESSAGES = MessageCache()
+
+
+def raw_sender(port):
+    """ Function sending raw bytes to port, or None when not supported
+
+        Ports may expose a send_bytes(data) method; mido's rtmidi backend
+        is reached through its underlying rtmidi object.
+    """
+    send_bytes = getattr(port, 'send_bytes', None)
+    if send_bytes is not None:
+        return send_bytes
+    rt = getattr(port, '_rt', None)
+    if rt is not None and hasattr(rt, 'send_message'):
+        return rt.send_message
+    return None
@@ -0,0 +1,248 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import threading
+import time
+from collections import deque
+
+import mido
+
+from messages import raw_sender
+
+
+def is_note_off(data):
+    return data[0] & 0xF0 == 0x80 or (data[0] & 0xF0 == 0x90 and data[2] == 0)
+
+
+class MidiWriter(object):
+    """ Output stage sending each tick's messages from a dedicated thread
+
+        Players only append encoded messages to the current tick's batch
+        (send/send_bytes never touch the port). flush() closes the batch and
+        queues it with its due time; the writer thread sends every batch in
+        one burst, note_offs first, once it is due.
+
+        The queue is bounded: when the port can't keep up, a new batch is
+        merged into the last queued one instead of blocking the engine, and
+        the overflow is counted in the metrics.
+
+        With a governor (see governor.BandwidthGovernor), each burst is
+        thinned to the port's byte budget as it is sent. With an
+        active-note table (see voices.ActiveNotes), what is left then has
+        its redundant note_offs removed and voices stolen to keep within
+        the polyphony limits, and close() releases the notes still
+        sounding.
+
+        Args:
+            port: mido output port (or any object with a send method)
+            maxsize: maximum number of batches waiting to be sent
+            governor: BandwidthGovernor of the port, or None
+            notes: ActiveNotes of the port, or None
+    """
+
+    def __init__(self, port, maxsize=64, governor=None, notes=None):
+        self._write_lock = threading.Lock()
+        self.governor = governor
+        self.notes = notes
+        self.port = port
+        self.maxsize = maxsize
+        self._batch = []
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._decoded = {}
+        self.reset_metrics()
+
+    @property
+    def port(self):
+        return self._port
+
+    @port.setter
+    def port(self, port):
+        """ Swap ports between bursts; the old port may then be closed """
+        with self._write_lock:
+            self._port = port
+            self._sender = (raw_sender(port), port,
+                            getattr(port, 'accepts_due', False))
+            if self.governor:
+                self.governor.reset_status()
+
+    def reset_metrics(self):
+        self.batches = 0
+        self.writes = 0
+        self.messages = 0
+        self.overflows = 0
+        self.max_depth = 0
+        self.max_lag = 0
+        self.total_lag = 0
+        self.max_write_time = 0
+
+    def metrics(self):
+        """ Backpressure and timing report (times in milliseconds), with
+            the active-note table's and governor's counters prefixed by
+            notes_ and governor_
+        """
+        metrics = {
+            'batches': self.batches,
+            'writes': self.writes,
+            'messages': self.messages,
+            'overflows': self.overflows,
+            'queued': len(self._queue),
+            'max_depth': self.max_depth,
+            'max_lag': self.max_lag / 1e6,
+            'mean_lag': self.total_lag / max(1, self.writes) / 1e6,
+            'max_write_time': self.max_write_time / 1e6,
+        }
+        if self.notes:
+            metrics.update(('notes_' + k, v)
+                           for k, v in self.notes.metrics().items())
+        if self.governor:
+            metrics.update(('governor_' + k, v)
+                           for k, v in self.governor.metrics().items())
+        return metrics
+
+    def send(self, msg):
+        self._batch.append(bytes(msg.bytes()))
+
+    def send_bytes(self, data):
+        self._batch.append(data)
+
+    def flush(self, due=None):
+        """ Queue the current tick's messages
+
+            Args:
+                due: perf_counter_ns time at which to send them
+                     (default: as soon as possible)
+        """
+        if not self._batch:
+            return
+        batch = self._batch
+        self._batch = []
+        if due is None:
+            due = time.perf_counter_ns()
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                # Kept as a separate burst so note_offs of this tick can't
+                # overtake note_ons of the previous one
+                self.overflows += 1
+                self._queue[-1][1].append(batch)
+            else:
+                self._queue.append((due, [batch]))
+                self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="MidiWriter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """ Stop the writer thread once every queued batch is sent """
+        self.flush()
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self.governor:
+            delayed = self.governor.drain()
+            if delayed:
+                self._write(time.perf_counter_ns(), [delayed], govern=False)
+        if self.notes:
+            self.panic()
+
+    def panic(self, channels=None):
+        """ Release every note sounding on the port, right away
+
+            Only meant for when nothing is queued (stopped, or queue just
+            discarded): notes of later bursts would sound again.
+
+            Args:
+                channels: channels to release (default: all of them)
+        """
+        with self._write_lock:
+            offs = self.notes.panic(channels)
+        if offs:
+            self._write(time.perf_counter_ns(), [offs], govern=False)
+
+    def discard(self, after):
+        """ Drop the queued batches due after `after` (perf_counter_ns)
+
+            Returns:
+                number of batches dropped
+        """
+        n = 0
+        with self._cond:
+            while self._queue and self._queue[-1][0] > after:
+                n += len(self._queue.pop()[1])
+        return n
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Batches stay queued (and discardable) until they are due
+                while True:
+                    if not self._queue:
+                        if not self._running:
+                            return
+                        self._cond.wait()
+                        continue
+                    delay = self._queue[0][0] - time.perf_counter_ns()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay / 1e9)
+                due, bursts = self._queue.popleft()
+            self._write(due, bursts)
+
+    def _write(self, due, bursts, govern=True):
+        t0 = time.perf_counter_ns()
+        with self._write_lock:
+            send_raw, port, accepts_due = self._sender
+            notes = self.notes if govern else None
+            governor = self.governor if govern else None
+            if self.governor and not govern:
+                self.governor.reset_status()    # Sent with status bytes
+            running = bool(governor and governor.running_status and send_raw
+                           and getattr(port, 'running_status', False))
+            sent = 0
+            for batch in bursts:
+                batch.sort(key=is_note_off, reverse=True)   # Stable sort
+                # Thinned first, so that the table only counts the note_ons
+                # actually sent (the note_offs of voices it steals are
+                # outside the budget)
+                if governor:
+                    batch = governor.filter(batch, t0, running)
+                if notes:
+                    batch = notes.filter(batch)
+                sent += len(batch)
+                if running:
+                    if batch:
+                        send_raw(governor.encode(batch))
+                    continue
+                if accepts_due:
+                    for data in batch:
+                        send_raw(data, due)
+                    continue
+                if send_raw:
+                    for data in batch:
+                        send_raw(data)
+                    continue
+                for data in batch:
+                    try:
+                        msg = self._decoded[data]
+                    except KeyError:
+                        msg = mido.Message.from_bytes(data)
+                        self._decoded[data] = msg
+                    port.send(msg)
+        t1 = time.perf_counter_ns()
+        lag = t0 - due
+        self.batches += len(bursts)
+        self.messages += sent
+        self.writes += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        self.max_write_time = max(self.max_write_time, t1 - t0)
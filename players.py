@@ -2,11 +2,32 @@
 # -*- coding: utf-8 -*-
 
 import random
+from array import array
+from copy import copy
 import mido
 
+from sampler import make_sampler
+from messages import MESSAGES, raw_sender
+from scales import Scale
+from tracing import TRACER, ALL, PROGRAM_CHANGE
+
 TICKS_PER_BEAT = 4
 
 
+class EventBuffer(object):
+    """ Port-like sink keeping the messages sent since it was last emptied
+    """
+    
+    def __init__(self):
+        self.pending = []
+    
+    def send(self, msg):
+        self.pending.append(bytes(msg.bytes()))
+    
+    def send_bytes(self, data):
+        self.pending.append(data)
+
+
 class StochaPlayer(object):
     durations = [1, 2, 3, 4, 6, 8, 12, 16, 24, 32]
     chords = [('Maj', (0, 4, 7)),
@@ -14,10 +35,24 @@ class StochaPlayer(object):
               ('Aug', (0, 4, 8)),
               ('dim', (0, 3, 6)),
               ]
+    # Function table first (one weight per action f0..fN), then
+    # silence durations and note/chord durations
+    # Ticked by the engine on every tick, not only when wait_nticks ends
+    every_tick = False
+    # Attributes changed by tick(), see get_state()
+    state_attrs = ('wait_nticks', 'played_notes')
+    default_weights = [[1],
+                       [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
+                       [1, 2, 0, 10, 0, 3, 0, 1, 0, 0]]
+    # What each action f0..fN does, for estimator.py: (notes played,
+    # weight table their duration is drawn with, None and the duration of
+    # each note in ticks for notes played one after the other)
+    action_profile = ((0, 1, None),)
     
     def __init__(self, midiout, channel=0, timesig=(4,4), scale=None):
         assert(midiout)
         self.midi = midiout
+        self.rng = random   # Anything with the `random` module API
         self.channel = channel
         self.program = 0
         self.volume = 1
@@ -31,55 +66,124 @@ class StochaPlayer(object):
         self.weights_desc = ["functions",
                              "silence durations",
                              "note/chord durations"]
-        self.update_weights([[5, 2, 2, 1],
-            [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
-            [1, 2, 0, 10, 0, 3, 0, 1, 0, 0]])
+        self.trace_id = TRACER.register(self.name)
+        self._actions = [getattr(self, name) for name in self.action_names()]
+        self.update_weights([list(t) for t in self.default_weights])
+    
+    @classmethod
+    def action_names(cls):
+        """ Names of the actions f0..fN defined by the class, in order """
+        names = []
+        while hasattr(cls, 'f{}'.format(len(names))):
+            names.append('f{}'.format(len(names)))
+        return names
+    
+    @property
+    def midi(self):
+        return self._midi
+    
+    @midi.setter
+    def midi(self, port):
+        self._midi = port
+        self._send_raw = raw_sender(port)
+    
+    def send_note(self, type, note, velocity=0):
+        """ Send a cached note_on/note_off, as raw bytes when the port allows
+        """
+        if self._send_raw:
+            self._send_raw(MESSAGES.bytes(type, self.channel, note, velocity))
+        else:
+            self.midi.send(MESSAGES.message(type, self.channel, note, velocity))
+    
+    def get_state(self):
+        """ Copy of what tick() changes, for set_state() to roll back to
+            
+            Includes the state of the player's random source, so the ticks
+            computed again after a rollback draw the same values.
+        """
+        state = [copy(getattr(self, a)) for a in self.state_attrs]
+        state.append(self.rng.getstate())
+        return state
+    
+    def set_state(self, state):
+        for a, value in zip(self.state_attrs, state):
+            setattr(self, a, value)
+        self.rng.setstate(state[-1])
     
     def set_scale(self, scale):
-        self.scale = sorted(scale)
+        """ Scale instances are shared as is, other note lists wrapped """
+        self.scale = scale if isinstance(scale, Scale) else Scale(scale)
     
     def update_weights(self, weights):
+        """ Replace every weight table
+
+            Raises:
+                ValueError if a table is empty or sums to zero, or if the
+                function table doesn't have one weight per action (the
+                previous weights are kept)
+        """
         assert(len(weights) > 0)
+        if len(weights[0]) != len(self._actions):
+            raise ValueError("{} has {} actions but {} function weights".format(
+                self.__class__.__name__, len(self._actions), len(weights[0])))
+        samplers = [make_sampler(table) for table in weights]
         self.weights = weights
-        self._fweights = []
-        for table in self.weights:
-            s = sum(table)
-            cumul = 0
-            formatted_table = []
-            for w in table:
-                formatted_table.append((w+cumul)/s)
-                cumul += w
-            self._fweights.append(formatted_table)
-    
-    def get_weighted_index(self, r, weights):
-        """Returns an index number depending on r and weights
-           
-           Args:
-               r: a float between 0 and 1
-               weights: list of weights
-           
-           Returns: an index number (between 0 and len(weights)-1)
+        self._samplers = samplers
+    
+    def set_weights(self, index, values):
+        """ Replace a single weight table
+            
+            Only that table's sampler is rebuilt. The new tables are swapped
+            in as new lists, one assignment each, so a tick running in
+            another thread sees either the old or the new sampler, never a
+            half-built one.
+            
+            Args:
+                index: index of the table in self.weights
+                values: the new weights
+            
+            Raises:
+                ValueError, as update_weights (the previous weights are kept)
         """
-        for i, p in enumerate(weights):
-            if r < p:
-                return i
+        values = list(values)
+        if index == 0 and len(values) != len(self._actions):
+            raise ValueError("{} has {} actions but {} function weights".format(
+                self.__class__.__name__, len(self._actions), len(values)))
+        sampler = make_sampler(values)
+        weights = list(self.weights)
+        weights[index] = values
+        samplers = list(self._samplers)
+        samplers[index] = sampler
+        self.weights = weights
+        self._samplers = samplers
     
     def program_change(self, num=0):
         m = mido.Message('program_change', channel=self.channel, program=num)
-        if __debug__:
-            print(m)
+        if TRACER.level >= ALL:
+            TRACER.record(self.trace_id, PROGRAM_CHANGE, (num,), 0)
         self.midi.send(m)
         self.program = num
     
     def set_volume(self, vol):
         self.volume = vol
     
+    def playing_fraction(self, weights=None):
+        """ Share of the time the player runs its actions at all, with
+            weights (default: its own)
+        """
+        return 1.0
+    
     def stop_all_notes(self):
-        for note in self.played_notes:
-            self.midi.send(mido.Message('note_off',
-                                        channel=self.channel, note=note))
+        self.release_notes()
         self.wait_nticks = 0
     
+    def release_notes(self):
+        """ Send the note_offs of the notes played last, once """
+        if self.played_notes:
+            for note in self.played_notes:
+                self.send_note('note_off', note)
+            self.played_notes = []
+    
     def play_notes(self, notes, dur=None):
         """ Play notes with a given (or random if dur=None) duration
             
@@ -95,78 +199,108 @@ class StochaPlayer(object):
                     whole note (semibreve)	    	16
                     double note (breve)			    32
         """
-        vol = int(self.volume * random.gauss(64, 16))
+        vol = int(self.volume * self.rng.gauss(64, 16))
+        vol = min(max(vol, 1), 127)
         for note in notes:
-            if __debug__:
-                print(note, end=', ')
-            self.midi.send(mido.Message('note_on', channel=self.channel,
-                note=note, velocity=vol))
+            self.send_note('note_on', note, vol)
         if not dur:
-            i = self.get_weighted_index(random.random(), self._fweights[2])
+            i = self._samplers[2](self.rng.random())
             dur = self.durations[i]
         self.wait_nticks = dur - 1  # skip a tick
         self.played_notes = notes
     
+    def events(self, rng=random, n_ticks=None, start=0):
+        """ Lazy stream of what the player plays, ticking on its own
+            
+            The player must be active (players are built inactive): an
+            inactive player yields nothing. Its midi output is replaced
+            for good by a buffer emptied after every tick, so nothing
+            accumulates however long the stream; the player can't be used
+            in an Engine afterwards, unless its midi output is set back.
+            Since the engine's draws don't depend on its players, giving
+            each player its own copy of the engine's random stream yields
+            the events it would play in an Engine with that stream.
+            
+            Args:
+                rng: source of the per-tick values (like Engine's rng)
+                n_ticks: length of the stream (None: endless). The notes
+                         still sounding are released at its end.
+                start: tick number of the first tick
+            
+            Yields:
+                (absolute tick, message bytes)
+        """
+        buffer = EventBuffer()
+        self.midi = buffer
+        pending = buffer.pending
+        tick = start
+        while n_ticks is None or tick < start + n_ticks:
+            TRACER.tick = tick
+            self.tick(rng.random(), rng.random(), rng.random())
+            if pending:
+                for data in pending:
+                    yield tick, data
+                del pending[:]
+            tick += 1
+        self.stop_all_notes()
+        for data in pending:
+            yield tick, data
+        del pending[:]
+    
     def tick(self, *rand):
         if self.wait_nticks > 0:
             self.wait_nticks -= 1
             return
-        for note in self.played_notes:
-            self.midi.send(mido.Message('note_off',
-                                        channel=self.channel, note=note))
+        self.release_notes()
         
         if self.active:
-            i = self.get_weighted_index(rand[0], self._fweights[0])
-            eval("self.f{}(*rand[1:])".format(i))
+            i = self._samplers[0](rand[0])
+            self._actions[i](*rand[1:])
+            if TRACER.level:
+                TRACER.action(self, i)
     
     def f0(self, *rand):
         """Silence"""
-        i = self.get_weighted_index(rand[0], self._fweights[1])
+        i = self._samplers[1](rand[0])
         self.wait_nticks = self.durations[i] - 1
-        if __debug__:
-            print('-', end=' ')
 
 
 class Chaotic(StochaPlayer):
     name = "Chaotic"
     color = "#aa5555"
-    
-    def __init__(self, midiout, channel=0, timesig=(4,4)):
-        super(Chaotic, self).__init__(midiout, channel, timesig)
-        self.update_weights([[5, 2, 2, 1],
-            [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
-            [1, 2, 0, 10, 0, 3, 0, 1, 0, 0]])
+    default_weights = [[5, 2, 2, 1],
+                       [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
+                       [1, 2, 0, 10, 0, 3, 0, 1, 0, 0]]
+    action_profile = ((0, 1, None), (1, 2, None), (2, 2, None), (3, 2, None))
     
     def f1(self, *rand):
         """Play a random note"""
-        pitch = random.choice(self.scale)
+        pitch = self.rng.choice(self.scale)
         self.play_notes([pitch])
     
     def f2(self, *rand):
         """Play two different random notes"""
-        notes = random.sample(self.scale, 2)
+        notes = self.rng.sample(self.scale, 2)
         self.play_notes(notes)
     
     def f3(self, *rand):
         """Play three different random notes"""
-        notes = random.sample(self.scale, 3)
+        notes = self.rng.sample(self.scale, 3)
         self.play_notes(notes)
 
 
 class Basic(StochaPlayer):
     name = "Basic"
     color = "#00ff00"
-    
-    def __init__(self, midiout, channel=0, timesig=(4,4)):
-        super(Basic, self).__init__(midiout, channel, timesig)
-        self.update_weights([[5, 2, 2, 1],
-            [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
-            [1, 2, 0, 10, 0, 3, 0, 1, 0, 0]])
+    default_weights = [[5, 2, 2, 1],
+                       [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
+                       [1, 2, 0, 10, 0, 3, 0, 1, 0, 0]]
+    action_profile = ((0, 1, None), (1, 2, None), (2, 2, None), (3, 2, None))
     
     def f1(self, *rand):
         """Play a random note"""
         note = self.scale[int(rand[0]*len(self.scale))]
-        i = self.get_weighted_index(rand[1], self._fweights[2])
+        i = self._samplers[2](rand[1])
         dur =  self.durations[i]
         self.play_notes([note], dur)
     
@@ -176,50 +310,55 @@ class Basic(StochaPlayer):
         note = self.scale[index]
         index2 = int(rand[1]*len(self.scale)) % len(self.scale)
         note2 = self.scale[index2]
-        i = self.get_weighted_index(rand[1], self._fweights[2])
+        i = self._samplers[2](rand[1])
         dur =  self.durations[i]
         self.play_notes([note, note2], dur)
     
     def f3(self, *rand):
         """Play a triad"""
-        i0 = int(rand[0]*len(self.scale))
-        i1 = (i0+2) % len(self.scale)
-        i2 = (i0+4) % len(self.scale)
-        i = self.get_weighted_index(rand[1], self._fweights[2])
+        triad = self.scale.triads[int(rand[0]*len(self.scale))]
+        i = self._samplers[2](rand[1])
         dur =  self.durations[i]
-        self.play_notes([self.scale[i0], self.scale[i1], self.scale[i2]], dur)
+        self.play_notes(triad, dur)
 
 
 class Soloist(StochaPlayer):
     name = "Soloist"
     color = "#ff0000"
+    state_attrs = StochaPlayer.state_attrs + ('index', 'direction')
+    default_weights = [[2, 1, 4, 4, 2],
+                       [8, 12, 1, 4, 0, 1, 0, 0, 0, 0],
+                       [8, 2, 0, 4, 0, 2, 0, 1, 0, 0]]
+    action_profile = ((0, 1, None), (1, 2, None), (1, 2, None), (1, 2, None),
+                      (1, 2, None))
     
     def __init__(self, midiout, channel=0, timesig=(4,4)):
         super(Soloist, self).__init__(midiout, channel, timesig)
         self.direction = 1
         self.index = 0
-        self.update_weights([[2, 1, 4, 4, 2],
-            [8, 12, 1, 4, 0, 1, 0, 0, 0, 0],
-            [8, 2, 0, 4, 0, 2, 0, 1, 0, 0]])
+    
+    def set_scale(self, scale):
+        super(Soloist, self).set_scale(scale)
+        self.index = min(self.index, len(self.scale) - 1)
     
     def f1(self, *rand):
         """Play a new random note"""
         self.index = int(rand[0]*len(self.scale))
-        i = self.get_weighted_index(rand[1], self._fweights[2])
+        i = self._samplers[2](rand[1])
         dur =  self.durations[i]
         self.play_notes([self.scale[self.index]], dur)
     
     def f2(self, *rand):
         """Play next note on scale (1 step)"""
-        self.index = (self.index + self.direction) % len(self.scale)
-        i = self.get_weighted_index(rand[1], self._fweights[2])
+        self.index = self.scale.wrapped[self.direction][self.index]
+        i = self._samplers[2](rand[1])
         dur =  self.durations[i]
         self.play_notes([self.scale[self.index]], dur)
     
     def f3(self, *rand):
         """Play next note on scale (2 steps)"""
-        self.index = (self.index + 2*self.direction) % len(self.scale)
-        i = self.get_weighted_index(rand[1], self._fweights[2])
+        self.index = self.scale.wrapped[2*self.direction][self.index]
+        i = self._samplers[2](rand[1])
         dur =  self.durations[i]
         self.play_notes([self.scale[self.index]], dur)
     
@@ -232,48 +371,52 @@ class Soloist(StochaPlayer):
 class Pad(Basic):
     name = "Pad"
     color = "#0000ff"
-    
-    def __init__(self, midiout, channel=0, timesig=(4,4)):
-        super(Pad, self).__init__(midiout, channel, timesig)
-        self.durations = list(map(lambda x: x*4, self.durations))
-        self.update_weights([[6, 2, 2, 4],
-            [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
-            [1, 2, 0, 10, 0, 6, 0, 6, 0, 4]])
+    durations = [d*4 for d in Basic.durations]
+    default_weights = [[6, 2, 2, 4],
+                       [1, 2, 0, 10, 0, 3, 0, 1, 0, 0],
+                       [1, 2, 0, 10, 0, 6, 0, 6, 0, 4]]
 
 
 class Monotone(StochaPlayer):
     name = "Monotone"
     color = "#ff00ff"
+    state_attrs = StochaPlayer.state_attrs + ('pitch', 'halfbeat')
+    durations = [d*4 for d in StochaPlayer.durations]
+    default_weights = [[1, 10, 2, 1],
+                       [8, 12, 1, 4, 0, 1, 0, 0, 0, 0],
+                       [1, 2, 0, 10, 0, 4, 0, 1, 0, 1]]
+    # f2 always comes twice in a row (on the beat, then half a beat later)
+    action_profile = ((0, 1, None), (1, None, TICKS_PER_BEAT),
+                      (2, None, TICKS_PER_BEAT//2), (1, None, TICKS_PER_BEAT))
     
     def __init__(self, midiout, channel=0, timesig=(4,4)):
         super(Monotone, self).__init__(midiout, channel, timesig)
         self.pitch = None
-        self.durations = list(map(lambda x: x*4, self.durations))
-        self.update_weights([[1, 10, 2, 1],
-            [8, 12, 1, 4, 0, 1, 0, 0, 0, 0],
-            [1, 2, 0, 10, 0, 4, 0, 1, 0, 1]])
         self.halfbeat = False
     
     def set_scale(self, scale):
-        self.scale = sorted(scale)
-        self.pitch = random.choice(self.scale)
+        super(Monotone, self).set_scale(scale)
+        # Drawn on the next tick, so from the stream the player ticks with
+        self.pitch = None
     
     def tick(self, *rand):
         if self.wait_nticks > 0:
             self.wait_nticks -= 1
             return
-        if self.played_notes:
-            for note in self.played_notes:
-                self.midi.send(mido.Message('note_off',
-                     channel=self.channel, note=note))
+        self.release_notes()
         
         if not self.active:
             return
+        if self.pitch is None and self.scale:
+            self.pitch = self.rng.choice(self.scale)
         if self.halfbeat:
+            i = 2
             self.f2(*rand[1:])
         else:
-            i = self.get_weighted_index(r1, self._fweights[0])
-            eval("self.f{}(*rand[1:])".format(i))
+            i = self._samplers[0](rand[0])
+            self._actions[i](*rand[1:])
+        if TRACER.level:
+            TRACER.action(self, i)
     
     def f1(self, *rand):
         """Play on beat"""
@@ -293,6 +436,18 @@ class Monotone(StochaPlayer):
 
 
 class BasicLooper(Basic):
+    """ Basic player replaying the measures it recorded
+        
+        The random values of every recorded tick are kept in a ring buffer
+        of n_measures measures, preallocated as a flat array of shape
+        (n_measures, ticks_in_measure, N_RAND): recording and replaying
+        index it directly, with no array or tuple built per tick.
+        
+        Args:
+            n_measures: number of measures kept in memory
+            loop_lengths: number of measures replayed by REPEAT1 and REPEAT2
+                          (each at most n_measures)
+    """
     name = "Basic Looper"
     color = "#aaaa00"
     # States
@@ -300,81 +455,95 @@ class BasicLooper(Basic):
     REPEAT1 = 1
     REPEAT2 = 2
     RECORDING = 3
-    
-    def __init__(self, midiout, channel=0, timesig=(4,4)):
+    N_RAND = 3      # Random values recorded per tick
+    every_tick = True
+    state_attrs = Basic.state_attrs + ('ticks_counter', 'i_measure', 'state',
+                                       'n_recorded', 'memory')
+    
+    default_weights = [[1, 3, 2, 1],
+                       [1, 2, 0, 10, 0, 2, 0, 1, 0, 0],
+                       [1, 2, 0, 10, 0, 2, 0, 1, 0, 0],
+                       [0, 1, 1, 3]]
+    
+    def __init__(self, midiout, channel=0, timesig=(4,4), n_measures=4,
+                 loop_lengths=(1, 2)):
         super(BasicLooper, self).__init__(midiout, channel, timesig)
+        if max(loop_lengths) > n_measures:
+            raise ValueError("loops of {} measures but only {} kept".format(
+                max(loop_lengths), n_measures))
         self.ticks_counter = 0
         self.ticks_in_measure = TICKS_PER_BEAT * timesig[0]
-        self.patterns = []
-        self.measure_pattern = []
-        self.i_measure = 0
+        self.n_measures = n_measures
+        self.loop_lengths = {self.REPEAT1: loop_lengths[0],
+                             self.REPEAT2: loop_lengths[1]}
+        self.measure_size = self.ticks_in_measure * self.N_RAND
+        self.memory = array('d', bytes(8 * n_measures * self.measure_size))
+        self.n_recorded = 0     # Measures recorded so far
+        self.i_measure = 0      # Measure of the loop being replayed
         self.state = self.RECORDING
         self.weights_desc = ["basic functions",
                              "silence durations",
                              "note/chord durations",
                              "looping function"]
-        self.update_weights([[1, 3, 2, 1],
-            [1, 2, 0, 10, 0, 2, 0, 1, 0, 0],
-            [1, 2, 0, 10, 0, 2, 0, 1, 0, 0],
-            [0, 1, 1, 3]])
+    
+    def playing_fraction(self, weights=None):
+        """ Share of the time out of the SILENCE state, with weights
+            (default: its own)
+        """
+        table = (weights or self.weights)[3]
+        lengths = [self.loop_lengths.get(state, 1)
+                   for state in range(len(table))]
+        total = sum(w * n for w, n in zip(table, lengths))
+        return 1 - table[self.SILENCE] * lengths[self.SILENCE] / total
     
     def change_state(self, r):
-        i = self.get_weighted_index(r, self._fweights[3])
+        i = self._samplers[3](r)
         self.state = i
         self.ticks_counter = 0
         self.i_measure = 0
         self.stop_all_notes()
     
+    def offset(self, measure, tick):
+        """ Position in memory of a tick of the measure-th recorded measure """
+        return ((measure % self.n_measures) * self.measure_size
+                + tick * self.N_RAND)
+    
     def tick(self, *rand):
-        #self.ticks_counter += 1
         if self.ticks_counter >= self.ticks_in_measure:
-            if self.state == self.REPEAT2 and self.i_measure == 0:
-                self.ticks_counter = 0
+            self.ticks_counter = 0
+            if self.state == self.RECORDING:
+                self.n_recorded += 1
+                self.change_state(rand[2])
+            elif self.i_measure + 1 < self.loop_lengths.get(self.state, 0):
                 self.i_measure += 1
                 self.stop_all_notes()
-            elif self.state == self.RECORDING:
-                # add pattern to memory
-                if len(self.patterns) < 2:
-                    self.patterns.append(self.measure_pattern)
-                else:
-                    self.patterns[0] = self.patterns[1]
-                    self.patterns[1] = self.measure_pattern[:]
-                self.measure_pattern = []
-                self.change_state(rand[2])
             else:
                 self.change_state(rand[2])
         
-        if self.state == self.SILENCE:
-            pass
-        
-        elif self.state == self.REPEAT1:
-            assert(self.ticks_counter < len(self.patterns[-1]))
-            if len(self.patterns) >= 1:
-                super(BasicLooper, self).tick(*(self.patterns[-1][self.ticks_counter]))
-            else:
-                pass
+        if self.state in self.loop_lengths:
+            length = self.loop_lengths[self.state]
+            if self.n_recorded < length:
+                # Not enough memory yet: record a whole measure instead
                 self.state = self.RECORDING
-        
-        elif self.state == self.REPEAT2:
-            if len(self.patterns) >= 2:
-                assert(self.ticks_counter<self.ticks_in_measure)
-                assert(self.i_measure<len(self.patterns))
-                try:
-                    super(BasicLooper, self).tick(*(self.patterns[self.i_measure][self.ticks_counter]))
-                except IndexError:
-                    print(self.ticks_counter)
-                    print(self.ticks_in_measure)
-                    print(self.i_measure)
-                    for p in self.patterns:
-                        print(len(p), p)
+                self.ticks_counter = 0
+                self.i_measure = 0
             else:
-                pass
-                self.state = self.RECORDING
+                i = self.offset(self.n_recorded - length + self.i_measure,
+                                self.ticks_counter)
+                memory = self.memory
+                # Read one by one: a slice would be a new array
+                super(BasicLooper, self).tick(memory[i], memory[i+1],
+                                              memory[i+2])
         
-        elif self.state == self.RECORDING:
-            self.measure_pattern.append(rand)
+        if self.state == self.RECORDING:
+            i = self.offset(self.n_recorded, self.ticks_counter)
+            memory = self.memory
+            for k in range(self.N_RAND):
+                memory[i+k] = rand[k]
             super(BasicLooper, self).tick(*rand)
         
         self.ticks_counter += 1
-        
-            
+
+
+PLAYERS = [Basic, Chaotic, Soloist, Pad, Monotone, BasicLooper]
+PLAYER_CLASSES = dict((P.__name__, P) for P in PLAYERS)
@@ -0,0 +1,289 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Headless offline renderer
+
+    Ticks players as fast as possible and writes the result to a Standard
+    MIDI File, one track per player. Never imports tkinter.
+
+    The engine and every player draw from their own stream of the session
+    seed, so a seed gives the same file whether players are rendered in
+    one process or spread across several (--jobs).
+
+    Usage:
+        python -O render.py out.mid --duration 3600 --tempo 120 --seed 1
+"""
+
+from __future__ import division, print_function
+import argparse
+import random
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import mido
+import numpy as np
+
+from players import TICKS_PER_BEAT, PLAYERS, PLAYER_CLASSES
+from scales import SCALES, C2, get_scale
+from engine import Engine
+from rng import stream, ENGINE_SLOT
+from cache import RenderCache, render_key, pack_tracks, unpack_tracks
+from export import note_array, save_notes, save_roll
+
+
+# What the MIDI file writers need to know about the player of a track
+Track = namedtuple('Track', 'name channel program')
+
+
+class TrackRecorder(object):
+    """ Port-like sink storing (tick, encoded message) pairs
+
+        Supports the raw bytes send path, so players hand it their cached
+        pre-encoded messages.
+
+        Args:
+            engine: the engine whose tick counter timestamps messages
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.events = []
+
+    def send(self, msg):
+        self.events.append((self.engine.n_tick, bytes(msg.bytes())))
+
+    def send_bytes(self, data):
+        self.events.append((self.engine.n_tick, data))
+
+    def close(self):
+        pass
+
+
+def render(players, n_ticks, rng=random):
+    """ Render players offline
+
+        Args:
+            players: list of players (their midi output will be replaced)
+            n_ticks: length of the rendering, in ticks
+            rng: random source of the engine
+
+        Returns:
+            list of (player, events) where events is a list of
+            (tick, bytes) pairs
+    """
+    engine = Engine(rng=rng)
+    recorders = []
+    for p in players:
+        rec = TrackRecorder(engine)
+        p.midi = rec
+        p.active = True
+        engine.add_player(p)
+        recorders.append(rec)
+    engine.run(n_ticks)
+    # Release the notes still sounding at the end of the rendering
+    for p in players:
+        p.stop_all_notes()
+    return [(p, rec.events) for p, rec in zip(players, recorders)]
+
+
+def make_player(spec, seed, slot):
+    """ Build a player from its description
+
+        Args:
+            spec: dict with the player's 'class' name, 'scale' as a
+                  (tonic, scale name, octaves) tuple and optionally its
+                  'channel', 'weights', 'volume' and 'program'. Specs are
+                  plain data, so they can be sent to worker processes.
+            seed: session seed
+            slot: stream of the seed the player draws from (1, 2...)
+    """
+    p = PLAYER_CLASSES[spec['class']](TrackRecorder(None),
+                                      channel=spec.get('channel', 0))
+    p.rng = stream(seed, slot)
+    if spec.get('weights'):
+        p.update_weights([list(t) for t in spec['weights']])
+    p.set_scale(get_scale(*spec['scale']))
+    p.set_volume(spec.get('volume', 1))
+    p.program = spec.get('program', 0)
+    return p
+
+
+def render_slots(slots, n_ticks, seed):
+    """ Render (slot, spec) pairs in this process
+
+        Returns:
+            list of (slot, Track, events)
+    """
+    players = [make_player(spec, seed, slot) for slot, spec in slots]
+    tracks = render(players, n_ticks, stream(seed, ENGINE_SLOT))
+    return [(slot, Track(p.name, p.channel, p.program), events)
+            for (slot, _), (p, events) in zip(slots, tracks)]
+
+
+def render_specs(specs, n_ticks, seed, jobs=1):
+    """ Render players described by specs, in up to `jobs` processes
+
+        Player i of specs draws from stream i+1 of the seed and the engine
+        of each process from stream ENGINE_SLOT: the engine's draws don't
+        depend on its players, so splitting them across processes leaves
+        every track unchanged.
+
+        Returns:
+            list of (Track, events) in the order of specs
+    """
+    slots = list(enumerate(specs, 1))
+    jobs = max(1, min(jobs, len(slots)))
+    if jobs == 1:
+        results = render_slots(slots, n_ticks, seed)
+    else:
+        chunks = [slots[i::jobs] for i in range(jobs)]
+        with ProcessPoolExecutor(jobs) as executor:
+            results = [r for chunk in executor.map(render_slots, chunks,
+                                                   repeat(n_ticks),
+                                                   repeat(seed))
+                       for r in chunk]
+        results.sort(key=lambda r: r[0])
+    return [(track, events) for _, track, events in results]
+
+
+def render_cached(cache, specs, n_ticks, seed, tempo=120, jobs=1):
+    """ render_specs() through a cache.RenderCache: hits skip rendering """
+    key = render_key(specs, n_ticks, seed, tempo)
+    data = cache.get(key)
+    if data is not None:
+        try:
+            return unpack_tracks(data, Track)
+        except ValueError:
+            pass    # Damaged: rendered again and replaced
+    tracks = render_specs(specs, n_ticks, seed, jobs)
+    cache.put(key, pack_tracks(tracks))
+    return tracks
+
+
+def to_midifile(tracks, tempo=120):
+    """ Build a multi-track mido.MidiFile from render() output
+
+        Args:
+            tracks: list of (player, events), as returned by render() (or
+                    render_specs(), with Tracks standing for the players)
+            tempo: tempo in beats per minute
+
+        Returns:
+            a type 1 mido.MidiFile, with one track per player
+    """
+    mid = mido.MidiFile(type=1, ticks_per_beat=TICKS_PER_BEAT)
+    meta = mido.MidiTrack()
+    meta.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(tempo)))
+    mid.tracks.append(meta)
+    for player, events in tracks:
+        track = mido.MidiTrack()
+        track.append(mido.MetaMessage('track_name', name=player.name))
+        track.append(mido.Message('program_change', channel=player.channel,
+                                  program=player.program))
+        last = 0
+        for tick, data in events:
+            track.append(mido.Message.from_bytes(data, time=tick-last))
+            last = tick
+        mid.tracks.append(track)
+    return mid
+
+
+def varlen(n):
+    """ Variable-length quantity encoding of a delta time """
+    out = bytearray([n & 0x7F])
+    n >>= 7
+    while n:
+        out.insert(0, 0x80 | (n & 0x7F))
+        n >>= 7
+    return bytes(out)
+
+
+def save_midifile(tracks, filename, tempo=120):
+    """ Write render() output straight to a Standard MIDI File
+
+        Same content as to_midifile(tracks, tempo).save(filename), but the
+        events are already encoded so no mido.Message is built.
+    """
+    chunks = [b'\x00\xFF\x51\x03' + struct.pack('>I', mido.bpm2tempo(tempo))[1:]]
+    for player, events in tracks:
+        name = player.name.encode('latin1')
+        data = [b'\x00\xFF\x03', varlen(len(name)), name,
+                b'\x00', bytes([0xC0 | player.channel, player.program])]
+        last = 0
+        deltas = {}
+        for tick, msg in events:
+            delta = tick - last
+            try:
+                data.append(deltas[delta])
+            except KeyError:
+                deltas[delta] = varlen(delta)
+                data.append(deltas[delta])
+            data.append(msg)
+            last = tick
+        chunks.append(b''.join(data))
+    with open(filename, 'wb') as f:
+        f.write(b'MThd' + struct.pack('>IHHH', 6, 1, len(chunks),
+                                      TICKS_PER_BEAT))
+        for chunk in chunks:
+            chunk += b'\x00\xFF\x2F\x00'
+            f.write(b'MTrk' + struct.pack('>I', len(chunk)) + chunk)
+
+
+def duration_to_ticks(seconds, tempo):
+    return int(seconds * tempo / 60 * TICKS_PER_BEAT)
+
+
+def main(argv=None):
+    classes = PLAYER_CLASSES
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('output', help="path of the .mid file to write")
+    parser.add_argument('-p', '--players', nargs='+', choices=sorted(classes),
+                        default=[P.__name__ for P in PLAYERS],
+                        help="player classes, one channel each")
+    parser.add_argument('-d', '--duration', type=float, default=60,
+                        help="length in seconds")
+    parser.add_argument('-t', '--tempo', type=int, default=120)
+    parser.add_argument('-s', '--scale', choices=sorted(SCALES),
+                        default='aeolian/minor')
+    parser.add_argument('--tonic', type=int, default=C2)
+    parser.add_argument('--octaves', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=None,
+                        help="session seed (printed when left random)")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="worker processes the players are split across")
+    parser.add_argument('--cache-dir', help="cache renderings there")
+    parser.add_argument('--cache-size', type=int, default=512,
+                        help="size limit of the cache in MB")
+    parser.add_argument('--notes', help="also save the notes as a .npy "
+                        "structured array (see export.py)")
+    parser.add_argument('--roll', help="also save the notes and their "
+                        "sparse piano-roll as a .npz")
+    args = parser.parse_args(argv)
+
+    seed = args.seed
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+        print("Seed: {}".format(seed))
+    scale = (args.tonic, args.scale, args.octaves)
+    specs = [{'class': name, 'channel': channel, 'scale': scale}
+             for channel, name in enumerate(args.players)]
+    n_ticks = duration_to_ticks(args.duration, args.tempo)
+    if args.cache_dir:
+        cache = RenderCache(args.cache_dir, args.cache_size * 2**20)
+        tracks = render_cached(cache, specs, n_ticks, seed, args.tempo,
+                               args.jobs)
+    else:
+        tracks = render_specs(specs, n_ticks, seed, args.jobs)
+    save_midifile(tracks, args.output, args.tempo)
+    if args.notes or args.roll:
+        notes = note_array(tracks, n_ticks)
+        if args.notes:
+            save_notes(notes, args.notes)
+        if args.roll:
+            save_roll(notes, n_ticks, args.roll, args.tempo)
+
+
+if __name__ == '__main__':
+    main()
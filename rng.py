@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+
+import numpy as np
+
+
+# Stream of a session seed used by the engine; players use the next ones
+ENGINE_SLOT = 0
+
+
+def stream(seed, slot):
+    """ Independent random source number `slot` of a session seed
+
+        Same stream as SeedSequence(seed).spawn(slot + 1)[slot], but built
+        without spawning the ones before, so a worker can get the stream
+        of any player on its own.
+
+        Args:
+            seed: session seed (an int)
+            slot: ENGINE_SLOT for the engine, 1, 2... for the players
+    """
+    return BlockRNG(np.random.SeedSequence(seed, spawn_key=(slot,)))
+
+
+class BlockStream(object):
+    """ Values of one distribution, generated a block at a time
+
+        Block k is drawn from its own child SeedSequence, so the stream can
+        be returned to any position (tell/seek) by regenerating one block.
+
+        Args:
+            seq: SeedSequence of the stream
+            method: name of the numpy Generator method drawing the values
+            block_size: number of values generated per block
+    """
+
+    def __init__(self, seq, method, block_size):
+        self.seq = seq
+        self.method = method
+        self.block_size = block_size
+        self.load(0)
+
+    def load(self, k):
+        seq = np.random.SeedSequence(self.seq.entropy,
+                                     spawn_key=self.seq.spawn_key + (k,))
+        draw = getattr(np.random.default_rng(seq), self.method)
+        self.values = draw(self.block_size).tolist()
+        self.block = k
+        self.i = 0
+
+    def next(self):
+        i = self.i
+        if i == self.block_size:
+            self.load(self.block + 1)
+            i = 0
+        self.i = i + 1
+        return self.values[i]
+
+    def tell(self):
+        return self.block * self.block_size + self.i
+
+    def seek(self, position):
+        k, i = divmod(position, self.block_size)
+        if k != self.block:
+            self.load(k)
+        self.i = i
+
+
+class BlockRNG(object):
+    """ Seedable random source pre-generating its values in NumPy blocks
+
+        Exposes the subset of the `random` module API used by the players
+        and the engine (random, gauss, choice, sample, randrange, getstate,
+        setstate), so it can be dropped in wherever `random` is used.
+        Uniforms and normals are drawn a block at a time and handed out as
+        Python floats. The state is just the position in both streams, so
+        getstate() is cheap enough to journal every tick.
+
+        Args:
+            seed: an int, a numpy SeedSequence or None (fresh entropy)
+            block_size: number of values generated per refill
+    """
+
+    def __init__(self, seed=None, block_size=4096):
+        self.block_size = block_size
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        key = seed.spawn_key
+        self._uniform = BlockStream(np.random.SeedSequence(
+            seed.entropy, spawn_key=key + (0,)), 'random', self.block_size)
+        self._normal = BlockStream(np.random.SeedSequence(
+            seed.entropy, spawn_key=key + (1,)), 'standard_normal',
+            self.block_size)
+        self.random = self._uniform.next
+        self.generator = np.random.default_rng(np.random.SeedSequence(
+            seed.entropy, spawn_key=key + (2,)))
+
+    def getstate(self):
+        return (self._uniform.tell(), self._normal.tell())
+
+    def setstate(self, state):
+        self._uniform.seek(state[0])
+        self._normal.seek(state[1])
+
+    def gauss(self, mu=0.0, sigma=1.0):
+        return mu + sigma * self._normal.next()
+
+    def randrange(self, n):
+        return int(self.random() * n)
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def sample(self, population, k):
+        """ k distinct elements of population (partial Fisher-Yates) """
+        pool = list(population)
+        n = len(pool)
+        if not 0 <= k <= n:
+            raise ValueError("sample larger than population")
+        for i in range(k):
+            j = i + int(self.random() * (n - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+    def uniforms(self, n):
+        """ NumPy array of n uniforms, for vectorized consumers
+
+            Drawn from a third stream, which getstate() doesn't cover.
+        """
+        return self.generator.random(n)
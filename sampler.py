@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+from bisect import bisect_right
+
+import numpy as np
+
+
+# Tables longer than this use the alias method
+ALIAS_THRESHOLD = 8
+
+
+def check_weights(weights):
+    """ Raise ValueError for tables no index could be drawn from """
+    if len(weights) == 0:
+        raise ValueError("empty weight table")
+    if min(weights) < 0:
+        raise ValueError("negative weight in {}".format(list(weights)))
+    if sum(weights) <= 0:
+        raise ValueError("all weights are zero in {}".format(list(weights)))
+
+
+def cumulative(weights):
+    """ Normalised cumulative table of a list of weights """
+    s = sum(weights)
+    cumul = 0
+    table = []
+    for w in weights:
+        cumul += w
+        table.append(cumul/s)
+    return table
+
+
+class BisectSampler(object):
+    """ Weighted index sampler, binary search in a cumulative table
+
+        Args:
+            weights: list of non-negative weights, at least one positive
+    """
+
+    def __init__(self, weights):
+        check_weights(weights)
+        self.weights = list(weights)
+        self.cumul = cumulative(weights)
+        # No r in [0, 1) may fall beyond the last boundary
+        top = max(i for i, w in enumerate(weights) if w > 0)
+        for i in range(top, len(weights)):
+            self.cumul[i] = 1.0
+
+    def __call__(self, r):
+        """ Index drawn from a uniform r in [0, 1) """
+        return bisect_right(self.cumul, r)
+
+    def sample_many(self, uniforms):
+        return np.searchsorted(np.asarray(self.cumul), uniforms, side='right')
+
+
+class AliasSampler(object):
+    """ Weighted index sampler in constant time (Walker/Vose alias method)
+
+        A single uniform r picks a column with int(r*n) and uses the
+        fractional part to choose between the column and its alias.
+
+        Args:
+            weights: list of non-negative weights, at least one positive
+    """
+
+    def __init__(self, weights):
+        check_weights(weights)
+        self.weights = list(weights)
+        n = len(weights)
+        s = sum(weights)
+        scaled = [w * n / s for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            l = small.pop()
+            g = large.pop()
+            self.prob[l] = scaled[l]
+            self.alias[l] = g
+            scaled[g] -= 1.0 - scaled[l]
+            if scaled[g] < 1.0:
+                small.append(g)
+            else:
+                large.append(g)
+        # Leftovers are 1.0 up to rounding errors
+        for i in small + large:
+            self.prob[i] = 1.0
+            self.alias[i] = i
+        self.n = n
+
+    def __call__(self, r):
+        """ Index drawn from a uniform r in [0, 1) """
+        x = r * self.n
+        i = int(x)
+        if x - i < self.prob[i]:
+            return i
+        return self.alias[i]
+
+    def sample_many(self, uniforms):
+        x = np.asarray(uniforms) * self.n
+        i = x.astype(np.intp)
+        prob = np.asarray(self.prob)
+        alias = np.asarray(self.alias)
+        return np.where(x - i < prob[i], i, alias[i])
+
+
+def make_sampler(weights):
+    """ Sampler best suited to the size of the weight table
+
+        Raises:
+            ValueError if the table is empty, has negative weights or sums
+            to zero
+    """
+    if len(weights) > ALIAS_THRESHOLD:
+        return AliasSampler(weights)
+    return BisectSampler(weights)
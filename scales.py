@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+## CONSTANTS
+C1 = 36
+C2 = 48
+C3 = 60
+
+
+# Diatonic scales
+SCALES = {
+    'ionian/Major': [2, 2, 1, 2, 2, 2, 1],
+    'dorian':       [2, 1, 2, 2, 2, 1, 2],
+    'phrygian':     [1, 2, 2, 2, 1, 2, 2],
+    'lydian':       [2, 2, 2, 1, 2, 2, 1],
+    'myxolidian':   [2, 2, 1, 2, 2, 1, 2],
+    'aeolian/minor':[2, 1, 2, 2, 1, 2, 2],
+    'locrian':      [1, 2, 2, 1, 2, 2, 2],
+
+# Pentatonic scales
+    'hirajoshi':    [4, 2, 1, 4, 1],
+    'insen':        [1, 4, 2, 3, 2],
+    'iwato':        [1, 4, 1, 4, 2],
+
+# Other scales
+    'enigmatic':    [1, 3, 2, 2, 2, 1, 1],
+    'flamenco':     [1, 3, 1, 2, 1, 3, 1],
+    'gypsy':        [2, 1, 3, 1, 1, 2, 2],
+    'prometheus':   [2, 2, 2, 3, 1, 2],
+    'phrygiandom':  [1, 3, 1, 2, 1, 2, 2],
+}
+
+
+def create_scale(tonic, pattern, octave=1):
+    """
+        Create an octave-repeating scale from a tonic note
+        and a pattern of intervals
+        
+        Args:
+            tonic: root note (midi note number)
+            pattern: pattern of intervals (list of numbers representing
+            intervals in semitones)
+            octave: span of scale (in octaves)
+        
+        Returns:
+            list of midi notes in the scale
+    """
+    assert(sum(pattern)==12)
+    scale = [tonic]
+    note = tonic
+    for o in range(octave):
+        for i in pattern:
+            note += i
+            if note <= 127:
+                scale.append(note)
+    return scale
+
+
+class Scale(tuple):
+    """
+        Immutable sorted scale with precomputed lookup tables
+        
+        Behaves as the tuple of its midi notes. Per degree i:
+            triads[i]       notes of the triad built on degree i (the third
+                            and fifth wrap around to the bottom of the scale)
+            wrapped[s][i]   degree s steps away, wrapping around the scale
+            clamped[s][i]   degree s steps away, stopping at the ends
+        for every step s in STEPS. pitch_classes is a 12-bit mask of the
+        pitch classes in the scale, and contains(note) a single lookup in
+        a 128-byte membership table.
+        
+        Args:
+            notes: midi notes of the scale
+    """
+    
+    STEPS = (-2, -1, 1, 2)
+    
+    def __new__(cls, notes):
+        self = super(Scale, cls).__new__(cls, sorted(notes))
+        n = len(self)
+        self.triads = tuple((self[i], self[(i+2) % n], self[(i+4) % n])
+                            for i in range(n))
+        self.wrapped = dict((s, tuple((i+s) % n for i in range(n)))
+                            for s in cls.STEPS)
+        self.clamped = dict((s, tuple(min(max(i+s, 0), n-1) for i in range(n)))
+                            for s in cls.STEPS)
+        members = bytearray(128)
+        self.pitch_classes = 0
+        for note in self:
+            members[note] = 1
+            self.pitch_classes |= 1 << (note % 12)
+        self.members = bytes(members)
+        return self
+    
+    def contains(self, note):
+        return self.members[note] == 1
+
+
+_registry = {}
+
+
+def get_scale(tonic, name, octaves=1):
+    """
+        Scale of SCALES by name, built once per (tonic, name, octaves)
+        
+        Returns:
+            the shared Scale instance
+    """
+    key = (tonic, name, octaves)
+    scale = _registry.get(key)
+    if scale is None:
+        scale = _registry[key] = Scale(create_scale(tonic, SCALES[name],
+                                                    octaves))
+    return scale
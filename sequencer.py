@@ -0,0 +1,151 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import threading
+import time
+import traceback
+from collections import deque
+
+import numpy as np
+
+from engine import Engine
+from clock import Clock
+from output import MidiWriter
+from voices import ActiveNotes
+from lookahead import Lookahead
+from rng import stream, ENGINE_SLOT
+
+
+class Sequencer(object):
+    """ Engine, clock and midi writer running in their own thread
+
+        Nothing but the sequencer thread touches the players once they are
+        added: other threads (the GUI) post() commands, which are run
+        between two ticks. The command queue is a deque, whose append and
+        popleft are atomic, so posting never blocks on the engine.
+        Reading the engine's counters for display (status()) is safe from
+        any thread.
+
+        The engine and the players draw from the streams of a session
+        seed, the n-th player added from stream n, like the n-th player
+        rendered by render.render_specs(). A session gives the notes
+        rendered offline with its seed only when its players are added,
+        activated and set up (scale, weights, channel, volume) as in the
+        specs before start(), and left alone: players added or activated
+        later start drawing at another point of the engine's stream.
+
+        Args:
+            port: midi output port
+            tempo: tempo in beats per minute
+            lookahead_ms: when set, ticks are computed that far ahead (see
+                          lookahead.Lookahead)
+            seed: session seed (an int), None for fresh entropy
+            governor: governor.BandwidthGovernor of the port, or None
+            polyphony: maximum number of notes sounding at once on each
+                       channel, None for no limit (see voices.ActiveNotes)
+    """
+
+    # Interval between two lookahead fills (seconds)
+    fill_interval = 0.02
+
+    def __init__(self, port, tempo=120, lookahead_ms=None, seed=None,
+                 governor=None, polyphony=None):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.n_streams = ENGINE_SLOT + 1
+        self.engine = Engine(rng=stream(seed, ENGINE_SLOT))
+        self.output = MidiWriter(port, governor=governor,
+                                 notes=ActiveNotes(polyphony))
+        self.clock = Clock(tempo)
+        self.lookahead = None
+        if lookahead_ms:
+            self.lookahead = Lookahead(self.engine, self.output, tempo,
+                                       lookahead_ms)
+        self._commands = deque()
+        self._running = False
+        self._thread = None
+
+    def post(self, fn, *args):
+        """ Run fn(*args) in the sequencer thread before the next tick """
+        self._commands.append((fn, args))
+
+    def add_player(self, player):
+        player.rng = stream(self.seed, self.n_streams)
+        self.n_streams += 1
+        self.post(self.engine.add_player, player)
+
+    def set_tempo(self, tempo):
+        self.post(self._set_tempo, tempo)
+
+    def _set_tempo(self, tempo):
+        self.clock.set_tempo(tempo)
+        if self.lookahead:
+            self.lookahead.set_tempo(tempo)
+
+    def _run_commands(self):
+        commands = self._commands
+        while commands:
+            fn, args = commands.popleft()
+            try:
+                if self.lookahead and fn != self._set_tempo:
+                    self.lookahead.update(fn, *args)
+                else:
+                    fn(*args)
+            except Exception:
+                # A bad command must not stop the music
+                traceback.print_exc()
+
+    def start(self):
+        self.output.start()
+        self._running = True
+        target = self._run_ahead if self.lookahead else self._run
+        self._thread = threading.Thread(target=target, name="Sequencer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.output.close()
+
+    def _run(self):
+        clock = self.clock
+        clock.start()
+        while self._running:
+            clock.sleep_until_next()
+            self._run_commands()
+            due = clock.next_target()
+            clock.advance()
+            self.engine.tick()
+            self.output.flush(due)
+
+    def _run_ahead(self):
+        while self._running:
+            self._run_commands()
+            self.lookahead.fill()
+            time.sleep(self.fill_interval)
+
+    def status(self):
+        """ Snapshot of the engine's counters, for display
+
+            max_lateness (ms) is the clock's when ticks are computed on
+            time, the writer's lag with a lookahead (the clock isn't run
+            then, and its counters are left out).
+        """
+        status = {'tick': self.engine.n_tick, 'tempo': self.clock.tempo,
+                  'players': len(self.engine.players),
+                  'pending_commands': len(self._commands)}
+        output = self.output.metrics()
+        status.update(('output_' + k, v) for k, v in output.items())
+        if self.lookahead:
+            status['invalidations'] = self.lookahead.invalidations
+            status['max_lateness'] = output['max_lag']
+        else:
+            clock = self.clock.stats()
+            status.update(('clock_' + k, v) for k, v in clock.items())
+            status['max_lateness'] = clock['max_lateness']
+        return status
@@ -9,6 +9,16 @@ import time
 import mido
 from collections import deque
 from players import *
+from scales import *
+from sampler import check_weights
+from loopback import LoopbackOutput
+from sequencer import Sequencer
+from tracing import TRACER, ALL
+from estimator import estimate, din_load
+from governor import BandwidthGovernor
+
+# Interval between two refreshes of the sequencer status (ms)
+STATUS_REFRESH_MS = 250
 
 # Backward compatibility with python 2.7
 if sys.version_info[0] < 3:
@@ -17,64 +27,6 @@ else:
     import tkinter as tk
 
 
-## CONSTANTS
-C1 = 36
-C2 = 48
-C3 = 60
-
-PLAYERS = [Basic, Chaotic, Soloist, Pad, Monotone, BasicLooper]
-
-
-# Diatonic scales
-SCALES = {
-    'ionian/Major': [2, 2, 1, 2, 2, 2, 1],
-    'dorian':       [2, 1, 2, 2, 2, 1, 2],
-    'phrygian':     [1, 2, 2, 2, 1, 2, 2],
-    'lydian':       [2, 2, 2, 1, 2, 2, 1],
-    'myxolidian':   [2, 2, 1, 2, 2, 1, 2],
-    'aeolian/minor':[2, 1, 2, 2, 1, 2, 2],
-    'locrian':      [1, 2, 2, 1, 2, 2, 2],
-
-# Pentatonic scales
-    'hirajoshi':    [4, 2, 1, 4, 1],
-    'insen':        [1, 4, 2, 3, 2],
-    'iwato':        [1, 4, 1, 4, 2],
-
-# Other scales
-    'enigmatic':    [1, 3, 2, 2, 2, 1, 1],
-    'flamenco':     [1, 3, 1, 2, 1, 3, 1],
-    'gypsy':        [2, 1, 3, 1, 1, 2, 2],
-    'prometheus':   [2, 2, 2, 3, 1, 2],
-    'phrygiandom':  [1, 3, 1, 2, 1, 2, 2],
-}
-
-
-def create_scale(tonic, pattern, octave=1):
-    """
-        Create an octave-repeating scale from a tonic note
-        and a pattern of intervals
-        
-        Args:
-            tonic: root note (midi note number)
-            pattern: pattern of intervals (list of numbers representing
-            intervals in semitones)
-            octave: span of scale (in octaves)
-        
-        Returns:
-            list of midi notes in the scale
-    """
-    assert(sum(pattern)==12)
-    scale = [tonic]
-    note = tonic
-    for o in range(octave):
-        for i in pattern:
-            note += i
-            if note <= 127:
-                scale.append(note)
-    return scale
-
-
-
 ################################################################################
 ################################################################################
 ################################################################################
@@ -84,6 +36,7 @@ class PlayerUI(tk.Frame):
     def __init__(self, master, player):
         super(PlayerUI, self).__init__(master)
         self.master = master
+        self.app = master.master
         self.player = player
         self.active = tk.IntVar()
         self.active.set(self.player.active)
@@ -119,7 +72,7 @@ class PlayerUI(tk.Frame):
         btn_activate.pack(side="left")
     
     def activate(self):
-        self.player.active = self.active.get()
+        self.app.apply(setattr, self.player, 'active', self.active.get())
     
     def open_midi_dialog(self):
         if self.dialog_midi == None:
@@ -184,9 +137,10 @@ class MidiDialog(tk.Toplevel):
         btn_ok.pack()
         
     def ok(self, *args):
-        self.player.channel = self.channel.get()
-        self.player.program_change(self.program.get())
-        self.player.set_volume(self.volume.get()/100)
+        app = self.master.app
+        app.apply(setattr, self.player, 'channel', self.channel.get())
+        app.apply(self.player.program_change, self.program.get())
+        app.apply(self.player.set_volume, self.volume.get()/100)
     
     def close_window(self):
         self.master.dialog_midi = None
@@ -252,15 +206,15 @@ class KeyDialog(tk.Toplevel):
     
     def ok(self, *args):
         scale_name = self.listb_scales.get(tk.ACTIVE)
-        new_scale = create_scale(self.rootnote.get(),
-                                 SCALES[scale_name], self.octavespan.get())
+        new_scale = get_scale(self.rootnote.get(), scale_name,
+                              self.octavespan.get())
         if self.var_apply_all.get() == 1:
             root = self.master.master.master
             for pui in root.players:
-                pui.player.set_scale(new_scale)
+                root.apply(pui.player.set_scale, new_scale)
                 print("Changed {} scale to {}".format(pui.player.name, scale_name))
         else:
-            self.player.set_scale(new_scale)
+            self.master.app.apply(self.player.set_scale, new_scale)
             print("Changed {} scale to {}".format(self.player.name, scale_name))
     
     def close_window(self):
@@ -275,6 +229,8 @@ class WeightsDialog(tk.Toplevel):
         self.master = master
         self.player = player
         self.values = []
+        self.var_table = {}     # Tk variable name -> index of its table
+        self.batch = False      # Set while randomize/mutate change many values
         
         # Name Label
         lbl_name = tk.Label(self,
@@ -297,9 +253,15 @@ class WeightsDialog(tk.Toplevel):
                 spinb_val = tk.Spinbox(table_frame, width=3, from_=0, to=50)
                 spinb_val["textvariable"] = table_val[-1]
                 spinb_val.pack(side="left")
+                self.var_table[str(table_val[-1])] = i
                 table_val[-1].trace("w", self.update_weights)
             self.values.append(table_val)
         
+        # Expected load of the weights shown
+        self.load = tk.StringVar()
+        tk.Label(self, textvariable=self.load).pack()
+        self.show_estimate()
+        
         # Bottom Buttons
         frame_buttons = tk.Frame(self)
         frame_buttons.pack()
@@ -311,16 +273,20 @@ class WeightsDialog(tk.Toplevel):
         btn_mutate.pack(side="left")
     
     def randomize(self):
+        self.batch = True
         for table in self.values:
             for val in table:
                 val.set(random.randint(0, 10))
-                ### UGLY, it calls update_weights for every set variable
+        self.batch = False
+        self.commit(range(len(self.values)))
     
     def mutate(self):
         def clamp(x):
             return min(max(x, 0), 100)
         
-        table = random.choice(self.values)
+        index = random.randrange(len(self.values))
+        table = self.values[index]
+        self.batch = True
         
         r = random.randint(0, 3)
         print(r)
@@ -348,11 +314,42 @@ class WeightsDialog(tk.Toplevel):
             for var in table:
                 var.set(clamp(var.get()**2))
         
+        self.batch = False
+        self.commit([index])
+    
+    def update_weights(self, name, *args):
+        """ Trace callback of a single spinbox """
+        if not self.batch:
+            self.commit([self.var_table[name]])
     
-    def update_weights(self, *args):
-        intvalues = [list(map(lambda x: x.get(), table)) for table in self.values]
-        self.player.update_weights(intvalues)
-        print("Weights updated for {}".format(self.player.name))
+    def commit(self, indices):
+        """ Send the tables at indices to the player, one set_weights each """
+        for i in indices:
+            try:
+                values = [var.get() for var in self.values[i]]
+                check_weights(values)
+            except (ValueError, tk.TclError) as e:
+                # Checked here since the player is updated in another thread
+                print("Weights rejected for {}: {}".format(self.player.name, e))
+                continue
+            self.master.app.apply(self.player.set_weights, i, values)
+            print("Weights updated for {} ({})".format(self.player.name,
+                  self.player.weights_desc[i]))
+        self.show_estimate()
+    
+    def show_estimate(self):
+        """ Expected notes/s, polyphony and midi load of the weights shown
+        """
+        try:
+            weights = [[var.get() for var in table] for table in self.values]
+            est = estimate(self.player, self.master.app.tempo.get(), weights)
+        except (ValueError, ZeroDivisionError, tk.TclError):
+            self.load.set("")
+            return
+        self.load.set("~{:.1f} notes/s, polyphony {:.1f}, {:.0f} B/s "
+                      "({:.1%} of a DIN link)".format(est['notes_per_s'],
+                      est['polyphony'], est['bytes_per_s'],
+                      din_load(est)[0]))
     
     def close_window(self):
         self.master.dialog_weights = None
@@ -360,7 +357,7 @@ class WeightsDialog(tk.Toplevel):
 
 
 class AddDialog(tk.Toplevel):
-    default_scale = create_scale(C2, SCALES['ionian/Major'], 1)
+    default_scale = get_scale(C2, 'ionian/Major', 1)
     
     def __init__(self, master):
         super(AddDialog, self).__init__(master)
@@ -395,7 +392,7 @@ class AddDialog(tk.Toplevel):
     
     def ok(self, *args):
         index = self.listb_players.curselection()
-        P = PLAYERS[index[0]](self.master.midiout)
+        P = PLAYERS[index[0]](self.master.sequencer.output)
         P.set_scale(self.default_scale)
         self.master.add_player(P)
         self.destroy()
@@ -426,6 +423,7 @@ class MidiConfigDialog(tk.Toplevel):
         self.listb_devices.bind('<Double-Button-1>', self.ok)
         for d in mido.get_output_names():
             self.listb_devices.insert(tk.END, d)
+        self.listb_devices.insert(tk.END, LoopbackOutput.name)
         
         # Ok/Cancel buttons
         buttons_frame = tk.Frame(self)
@@ -443,45 +441,77 @@ class MidiConfigDialog(tk.Toplevel):
     
     def ok(self, *args):
         dev = self.listb_devices.get(tk.ACTIVE)
-        self.master.midiout.close()
-        self.master.midiout = mido.open_output(dev,
-                                               autoreset=True)
+        old_midiout = self.master.midiout
+        if dev == LoopbackOutput.name:
+            self.master.midiout = LoopbackOutput()
+        else:
+            self.master.midiout = mido.open_output(dev,
+                                                   autoreset=True)
         assert(self.master.midiout)
-        for playerui in self.master.players:
-            #playerui.player.midi.close()
-            playerui.player.midi = self.master.midiout
+        # Players keep sending to the writer, only its port changes
+        self.master.sequencer.output.port = self.master.midiout
+        old_midiout.close()
         print("Midi device changed to {}".format(dev))
         self.destroy()
 
 
 class MainWindow(tk.Frame):
-    def __init__(self, master=None):
+    """ Main window
+
+        Players run in the sequencer's thread: every change made from the
+        GUI is posted to it (see apply), and the GUI only polls its status.
+
+        Args:
+            lookahead_ms: when set, ticks are computed that far ahead and
+                          released at their due time by the midi writer
+            seed: session seed, None for a random one
+            bandwidth: byte budget of the midi output per second, None for
+                       no limit
+            polyphony: maximum number of notes sounding at once on each
+                       channel, None for no limit
+    """
+    
+    def __init__(self, master=None, lookahead_ms=None, seed=None,
+                 bandwidth=None, polyphony=None):
         super(MainWindow, self).__init__(master)
         self.master = master
         self.master.protocol("WM_DELETE_WINDOW", self.client_exit)
         self.master.title("StochaPlay")
         #self.master.geometry("400x400")
         
-        self.midiout = mido.open_output(autoreset=True)
+        try:
+            self.midiout = mido.open_output(autoreset=True)
+        except (IOError, OSError, ImportError) as e:
+            print("No midi output ({}), using {}".format(e, LoopbackOutput.name))
+            self.midiout = LoopbackOutput()
         assert(self.midiout)
+        governor = None
+        if bandwidth:
+            governor = BandwidthGovernor(bandwidth)
+        self.sequencer = Sequencer(self.midiout, lookahead_ms=lookahead_ms,
+                                   seed=seed, governor=governor,
+                                   polyphony=polyphony)
+        print("Seed: {}".format(self.sequencer.seed))
         self.tempo = tk.IntVar()
         self.tempo.trace("w", self.update_time_step)
         self.tempo.set(120)
+        self.status = tk.StringVar()
         self.players = []
         
         self.pack()
         self.init_window()
         self.init_players()
         
-        self.tick()
+        self.sequencer.start()
+        self.refresh_status()
     
     def init_players(self):
-        s = Soloist(self.midiout, channel=2)
+        s = Soloist(self.sequencer.output, channel=2)
         s.set_volume(0.5)
-        s.set_scale(create_scale(C2, SCALES['gypsy'], 3))
-        s2 = Pad(self.midiout, channel=1)
+        s.set_scale(get_scale(C2, 'gypsy', 3))
+        s2 = Pad(self.sequencer.output, channel=1)
         s2.set_volume(0.5)
-        s2.set_scale(create_scale(C1, SCALES['aeolian/minor'], 2))
+        s2.set_scale(get_scale(C1, 'aeolian/minor', 2))
         self.add_player(s)
         self.add_player(s2)
     
@@ -489,6 +519,11 @@ class MainWindow(tk.Frame):
         p = PlayerUI(self.frame_players, player)
         p.pack()
         self.players.append(p)
+        self.sequencer.add_player(player)
+    
+    def apply(self, fn, *args):
+        """ Apply a change to the players, from the sequencer's thread """
+        self.sequencer.post(fn, *args)
     
     def init_window(self):        
         # Menu
@@ -513,16 +548,20 @@ class MainWindow(tk.Frame):
         btn_add = tk.Button(toolbar, text="+",
             command=self.open_add_player_dialog)
         btn_add.pack(side="right")
+        lbl_status = tk.Label(toolbar, textvariable=self.status)
+        lbl_status.pack(side="right")
         
         # Players Frame
         self.frame_players = tk.Frame(self)
         self.frame_players.pack()
     
     def update_time_step(self, *args):
-        dt = 60000 / self.tempo.get()
-        # Time step is divided by 4 for better resolution (4 ticks per beat)
-        dt /= TICKS_PER_BEAT
-        self.time_step = int(dt)
+        try:
+            tempo = self.tempo.get()
+        except (ValueError, tk.TclError):
+            return  # Spinbox being edited
+        if tempo > 0:
+            self.sequencer.set_tempo(tempo)
     
     def open_add_player_dialog(self):
         self.wait_window(AddDialog(self))
@@ -532,20 +571,22 @@ class MainWindow(tk.Frame):
     
     def client_exit(self):
         print("Goodbye !")
+        self.sequencer.stop()
+        TRACER.stop_dumper()
         self.midiout.close()
         self.master.destroy()
         sys.exit()
     
-    def tick(self):
-        r1 = random.random()
-        r2 = random.random()
-        r3 = random.random()
-        
-        for p in self.players:
-            p.tick(r1, r2, r3)
-        if __debug__:
-            print('.')
-        self.master.after(self.time_step, self.tick)
+    def refresh_status(self):
+        status = self.sequencer.status()
+        text = "tick {}  late {:.1f}ms  overflows {}".format(
+            status['tick'], status['max_lateness'],
+            status['output_overflows'])
+        if 'output_governor_throttled' in status:
+            text += "  throttled {}".format(
+                status['output_governor_throttled'])
+        self.status.set(text)
+        self.master.after(STATUS_REFRESH_MS, self.refresh_status)
 
 
 ################################################################################
@@ -565,9 +606,25 @@ if __name__ == '__main__':
     top.mainloop()
     """
     
-    #random.seed(0)
+    lookahead_ms = None
+    if '--lookahead' in sys.argv:
+        lookahead_ms = float(sys.argv[sys.argv.index('--lookahead') + 1])
+    seed = None
+    if '--seed' in sys.argv:
+        seed = int(sys.argv[sys.argv.index('--seed') + 1])
+    if '--trace' in sys.argv:
+        # What the players do, written to a CSV file as they play
+        TRACER.set_level(ALL)
+        TRACER.start_dumper(sys.argv[sys.argv.index('--trace') + 1])
+    bandwidth = None
+    if '--bandwidth' in sys.argv:
+        bandwidth = float(sys.argv[sys.argv.index('--bandwidth') + 1])
+    polyphony = None
+    if '--polyphony' in sys.argv:
+        polyphony = int(sys.argv[sys.argv.index('--polyphony') + 1])
     
     # Tkinter GUI below
     root = tk.Tk()
-    app = MainWindow(master=root)
+    app = MainWindow(master=root, lookahead_ms=lookahead_ms, seed=seed,
+                     bandwidth=bandwidth, polyphony=polyphony)
     app.mainloop()
@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Streaming pipelines over (absolute tick, message bytes) events
+
+    Sources are the players' events() generators, merged into one
+    time-ordered stream by merge(). Every stage is a generator taking a
+    stream and returning one, doing constant work per event; sinks consume
+    a stream. Nothing builds a list of events, so pipelines run in constant
+    memory however long the streams.
+
+    Example, one hour of three players an octave up, to a file:
+
+        for p in players:
+            p.active = True     # Players are built inactive
+        events = merge(*(p.events(rng.stream(seed, rng.ENGINE_SLOT), n_ticks)
+                         for p in players))
+        write_midifile(pipeline(events, partial(transpose, semitones=12)),
+                       'out.mid')
+
+    Each player gets its own copy of the engine's stream, so the merged
+    stream holds the notes render.render_specs() renders with that seed.
+"""
+
+from __future__ import division, print_function
+import heapq
+import random
+import struct
+from operator import itemgetter
+
+import mido
+
+from players import TICKS_PER_BEAT
+from messages import raw_sender
+from clock import Clock
+from render import varlen
+
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+
+
+def merge(*streams):
+    """ k-way merge of time-ordered streams, through a heap
+
+        Events of the same tick keep the order of the streams, as players
+        keep the order they were added in an Engine.
+    """
+    return heapq.merge(*streams, key=itemgetter(0))
+
+
+def pipeline(events, *stages):
+    """ Chain stages (functions of a stream) after a stream """
+    for stage in stages:
+        events = stage(events)
+    return events
+
+
+def transpose(events, semitones):
+    """ Shift notes, dropping those falling outside the midi range """
+    for tick, data in events:
+        kind = data[0] & 0xF0
+        if kind == NOTE_ON or kind == NOTE_OFF:
+            note = data[1] + semitones
+            if not 0 <= note <= 127:
+                continue
+            data = bytes((data[0], note, data[2]))
+        yield tick, data
+
+
+def scale_velocity(events, factor):
+    """ Multiply the velocity of note_ons, kept within 1..127 """
+    for tick, data in events:
+        if data[0] & 0xF0 == NOTE_ON and data[2] > 0:
+            velocity = min(max(int(data[2] * factor), 1), 127)
+            data = bytes((data[0], data[1], velocity))
+        yield tick, data
+
+
+def thin(events, probability, rng=random):
+    """ Drop each note with a probability, its note_off along with it
+
+        Dropped notes are counted per channel and pitch, so the note_offs
+        to drop are found in constant time and memory.
+    """
+    dropped = bytearray(16 * 128)
+    for tick, data in events:
+        kind = data[0] & 0xF0
+        if kind == NOTE_ON and data[2] > 0:
+            if rng.random() < probability:
+                key = (data[0] & 0x0F) << 7 | data[1]
+                dropped[key] = min(dropped[key] + 1, 255)
+                continue
+        elif kind == NOTE_OFF or kind == NOTE_ON:
+            key = (data[0] & 0x0F) << 7 | data[1]
+            if dropped[key]:
+                dropped[key] -= 1
+                continue
+        yield tick, data
+
+
+def write_midifile(events, filename, tempo=120):
+    """ Sink writing a stream to a single-track (type 0) MIDI file
+
+        Events go to the file as they come; the track length is patched in
+        once the stream ends.
+
+        Returns:
+            number of events written
+    """
+    n = 0
+    with open(filename, 'wb') as f:
+        f.write(b'MThd' + struct.pack('>IHHH', 6, 0, 1, TICKS_PER_BEAT))
+        f.write(b'MTrk\x00\x00\x00\x00')
+        size = f.write(b'\x00\xFF\x51\x03' +
+                       struct.pack('>I', mido.bpm2tempo(tempo))[1:])
+        last = 0
+        for tick, data in events:
+            size += f.write(varlen(tick - last) + data)
+            last = tick
+            n += 1
+        size += f.write(b'\x00\xFF\x2F\x00')
+        f.seek(18)
+        f.write(struct.pack('>I', size))
+    return n
+
+
+def send_to_port(events, port, tempo=120):
+    """ Sink playing a stream live, each event at the time of its tick
+
+        Ticks are counted from the first call; a stream starting late (or
+        a tempo too fast for the machine) is caught up as the Clock does.
+    """
+    send_raw = raw_sender(port)
+    clock = Clock(tempo)
+    clock.start()
+    for tick, data in events:
+        # Until tick itself is due (clock.n_tick ticks have been)
+        while clock.n_tick <= tick:
+            clock.sleep_until_next()
+            clock.advance()
+        if send_raw:
+            send_raw(data)
+        else:
+            port.send(mido.Message.from_bytes(data))
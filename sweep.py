@@ -0,0 +1,209 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Parameter sweep: render many player configurations at once
+
+    Renders a grid (every combination of the given classes, scales, tonics,
+    tempos and seeds) or a random sample of configurations, one player per
+    MIDI file, across a pool of worker processes. An index of the
+    configurations with summary statistics of their output is written to
+    index.csv in the output directory.
+
+    Usage:
+        python -O sweep.py out/ -c Basic Soloist -s dorian gypsy --seeds 1 2 3
+        python -O sweep.py out/ --random 500 --tempos 80 160 --sweep-seed 7
+"""
+
+from __future__ import division, print_function
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from players import TICKS_PER_BEAT, PLAYER_CLASSES
+from scales import SCALES, C2
+from render import (render_specs, render_cached, save_midifile,
+                    duration_to_ticks)
+from cache import RenderCache
+
+
+INDEX_FIELDS = ['file', 'class', 'scale', 'tonic', 'octaves', 'tempo', 'seed',
+                'weights', 'notes', 'notes_per_s', 'pitch_min', 'pitch_max',
+                'pitch_range', 'max_polyphony', 'mean_polyphony']
+
+
+def grid(classes, scales, tonics, octaves, tempos, seeds):
+    """ Every combination of the given values, as configurations """
+    for cls, scale, tonic, octv, tempo, seed in itertools.product(
+            classes, scales, tonics, octaves, tempos, seeds):
+        yield {'class': cls, 'scale': (tonic, scale, octv), 'tempo': tempo,
+               'seed': seed, 'weights': None}
+
+
+def random_configs(n, classes, scales, tonics, octaves, tempos, rng):
+    """ n configurations with random weight tables
+
+        Weights are drawn like WeightsDialog.randomize() does, tempos
+        uniformly between the lowest and highest of `tempos`.
+    """
+    for _ in range(n):
+        cls = rng.choice(classes)
+        weights = [[rng.randint(0, 10) for _ in table]
+                   for table in PLAYER_CLASSES[cls].default_weights]
+        for table in weights:
+            if not any(table):
+                table[rng.randrange(len(table))] = 1
+        yield {'class': cls,
+               'scale': (rng.choice(tonics), rng.choice(scales),
+                         rng.choice(octaves)),
+               'tempo': rng.randint(min(tempos), max(tempos)),
+               'seed': rng.getrandbits(32),
+               'weights': weights}
+
+
+def note_stats(events, n_ticks, tempo):
+    """ Summary statistics of a rendered track
+
+        Args:
+            events: (tick, bytes) pairs, as recorded by render()
+            n_ticks: length of the rendering
+
+        Returns:
+            dict with the number of notes, notes per second, lowest and
+            highest pitch, and the maximum and (time-weighted) mean number
+            of notes sounding at once
+    """
+    notes = 0
+    low, high = 127, 0
+    sounding = 0
+    max_sounding = 0
+    area = 0    # Sum of notes sounding x ticks
+    last = 0
+    for tick, data in events:
+        area += sounding * (tick - last)
+        last = tick
+        kind = data[0] & 0xF0
+        if kind == 0x90 and data[2] > 0:
+            notes += 1
+            sounding += 1
+            max_sounding = max(max_sounding, sounding)
+            low = min(low, data[1])
+            high = max(high, data[1])
+        elif kind == 0x80 or kind == 0x90:
+            sounding = max(0, sounding - 1)
+    area += sounding * (n_ticks - last)
+    seconds = n_ticks * 60 / (tempo * TICKS_PER_BEAT)
+    return {'notes': notes,
+            'notes_per_s': notes / seconds if seconds else 0,
+            'pitch_min': low if notes else None,
+            'pitch_max': high if notes else None,
+            'pitch_range': high - low if notes else 0,
+            'max_polyphony': max_sounding,
+            'mean_polyphony': area / n_ticks if n_ticks else 0}
+
+
+def render_config(job):
+    """ Render one configuration to its MIDI file (runs in a worker)
+
+        Args:
+            job: (index, configuration, duration in seconds, output dir,
+                  RenderCache or None)
+
+        Returns:
+            the configuration's row of the index
+    """
+    i, config, duration, outdir, cache = job
+    tempo = config['tempo']
+    n_ticks = duration_to_ticks(duration, tempo)
+    spec = {'class': config['class'], 'scale': config['scale'],
+            'weights': config['weights']}
+    if cache:
+        tracks = render_cached(cache, [spec], n_ticks, config['seed'], tempo)
+    else:
+        tracks = render_specs([spec], n_ticks, config['seed'])
+    filename = "{:05d}_{}.mid".format(i, config['class'])
+    save_midifile(tracks, os.path.join(outdir, filename), tempo)
+    tonic, scale, octaves = config['scale']
+    row = {'file': filename, 'class': config['class'], 'scale': scale,
+           'tonic': tonic, 'octaves': octaves, 'tempo': tempo,
+           'seed': config['seed'], 'weights': json.dumps(config['weights'])}
+    row.update(note_stats(tracks[0][1], n_ticks, tempo))
+    return row
+
+
+def sweep(configs, outdir, duration=60, workers=None, cache=None):
+    """ Render configurations across a process pool
+
+        Args:
+            configs: list of configurations (see grid and random_configs)
+            outdir: directory receiving the MIDI files and index.csv
+            duration: length of each rendering, in seconds
+            workers: number of processes (default: one per core)
+            cache: RenderCache shared by the workers
+
+        Returns:
+            the rows of the index, in the order of configs
+    """
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    workers = workers or os.cpu_count() or 1
+    jobs = [(i, c, duration, outdir, cache) for i, c in enumerate(configs)]
+    # Several configurations per task, a few tasks per worker
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(workers) as executor:
+        rows = list(executor.map(render_config, jobs, chunksize=chunksize))
+    with open(os.path.join(outdir, 'index.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, INDEX_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('output', help="directory to write the files to")
+    parser.add_argument('-c', '--classes', nargs='+',
+                        choices=sorted(PLAYER_CLASSES),
+                        default=sorted(PLAYER_CLASSES))
+    parser.add_argument('-s', '--scales', nargs='+', choices=sorted(SCALES),
+                        default=['aeolian/minor'])
+    parser.add_argument('--tonics', type=int, nargs='+', default=[C2])
+    parser.add_argument('--octaves', type=int, nargs='+', default=[2])
+    parser.add_argument('-t', '--tempos', type=int, nargs='+', default=[120])
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0],
+                        help="session seeds (grid only)")
+    parser.add_argument('-d', '--duration', type=float, default=60,
+                        help="length of each rendering in seconds")
+    parser.add_argument('-r', '--random', type=int, metavar='N',
+                        help="render N random configurations instead of "
+                             "the grid (tempos then give the range)")
+    parser.add_argument('--sweep-seed', type=int, default=None,
+                        help="seed of the random configurations")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument('--cache-dir', help="cache renderings there")
+    parser.add_argument('--cache-size', type=int, default=512,
+                        help="size limit of the cache in MB")
+    args = parser.parse_args(argv)
+
+    if args.random:
+        configs = random_configs(args.random, args.classes, args.scales,
+                                 args.tonics, args.octaves, args.tempos,
+                                 random.Random(args.sweep_seed))
+    else:
+        configs = grid(args.classes, args.scales, args.tonics, args.octaves,
+                       args.tempos, args.seeds)
+    cache = None
+    if args.cache_dir:
+        cache = RenderCache(args.cache_dir, args.cache_size * 2**20)
+    rows = sweep(list(configs), args.output, args.duration, args.workers,
+                 cache)
+    print("{} configurations rendered to {}".format(len(rows), args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import struct
+import threading
+from array import array
+
+
+# Levels
+OFF = 0
+NOTES = 1   # Actions playing notes
+ALL = 2     # Also silences and program changes
+
+MAX_NOTES = 3           # Notes kept per record
+PROGRAM_CHANGE = -1     # Action of program change records
+
+# Record layout of binary dumps: tick, player, action, notes, duration
+BINARY_RECORD = struct.Struct('<qib{}hi'.format(MAX_NOTES))
+
+
+class Tracer(object):
+    """ Ring buffer of what the players do, for debugging
+
+        Players record (tick, player id, action index, notes, duration)
+        tuples into preallocated columns, which costs no allocation and no
+        I/O on the tick path; a background thread can write them to a CSV
+        or binary file. With the level at OFF, the only cost left in a tick
+        is the test of the level.
+
+        Once full, the oldest records are overwritten (counted in `lost`
+        if they weren't dumped yet).
+
+        Args:
+            capacity: number of records kept
+            level: OFF, NOTES or ALL
+    """
+
+    def __init__(self, capacity=65536, level=OFF):
+        self.capacity = capacity
+        self.level = level
+        self.tick = 0       # Set by the engine, stamps the records
+        self.names = []     # Player id -> name
+        self._tick = array('q', bytes(8 * capacity))
+        self._player = array('i', bytes(4 * capacity))
+        self._action = array('b', bytes(capacity))
+        self._notes = array('h', [-1]) * (MAX_NOTES * capacity)
+        self._duration = array('i', bytes(4 * capacity))
+        self.count = 0      # Records written
+        self.lost = 0       # Records overwritten before being dumped
+        self._dumped = 0
+        self._dumper = None
+        self._stop = threading.Event()
+
+    def register(self, name):
+        """ Id of a new player, for its records """
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def set_level(self, level):
+        self.level = level
+
+    def record(self, player_id, action, notes, duration):
+        i = self.count % self.capacity
+        self._tick[i] = self.tick
+        self._player[i] = player_id
+        self._action[i] = action
+        j = MAX_NOTES * i
+        for k in range(MAX_NOTES):
+            self._notes[j+k] = notes[k] if k < len(notes) else -1
+        self._duration[i] = duration
+        self.count += 1
+
+    def action(self, player, index):
+        """ Record the action a player just ran (f0 is always a silence) """
+        notes = player.played_notes if index else ()
+        if notes or self.level >= ALL:
+            self.record(player.trace_id, index, notes, player.wait_nticks + 1)
+
+    def records(self, start=0, stop=None):
+        """ (tick, player id, action, notes, duration) still in the buffer,
+            from the start-th record written to the stop-th
+        """
+        if stop is None:
+            stop = self.count
+        for k in range(max(start, stop - self.capacity), stop):
+            i = k % self.capacity
+            j = MAX_NOTES * i
+            notes = tuple(n for n in self._notes[j:j+MAX_NOTES] if n >= 0)
+            yield (self._tick[i], self._player[i], self._action[i], notes,
+                   self._duration[i])
+
+    def dump(self, file, binary=False):
+        """ Write the records not dumped yet to a file
+
+            Args:
+                file: text file for CSV, binary file for BINARY_RECORDs
+        """
+        stop = self.count
+        start = self._dumped
+        if stop - start > self.capacity:
+            self.lost += stop - self.capacity - start
+        for tick, player, action, notes, duration in self.records(start, stop):
+            if binary:
+                padded = notes + (-1,) * (MAX_NOTES - len(notes))
+                file.write(BINARY_RECORD.pack(tick, player, action, *padded,
+                                              duration))
+            else:
+                name = ('program' if action == PROGRAM_CHANGE
+                        else 'f{}'.format(action))
+                file.write("{},{},{},{},{},{}\n".format(tick, player,
+                           self.names[player], name,
+                           ' '.join(map(str, notes)), duration))
+        file.flush()
+        self._dumped = stop
+
+    def start_dumper(self, path, binary=False, interval=0.5):
+        """ Dump to path every `interval` seconds, in a background thread """
+        self.stop_dumper()
+        f = open(path, 'wb' if binary else 'w')
+        if not binary:
+            f.write("tick,player,name,action,notes,duration\n")
+        self._dumped = self.count
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.dump(f, binary)
+            self.dump(f, binary)
+            f.close()
+
+        self._dumper = threading.Thread(target=run, name="Trace dumper")
+        self._dumper.daemon = True
+        self._dumper.start()
+
+    def stop_dumper(self):
+        """ Dump what is left and close the file """
+        if self._dumper:
+            self._stop.set()
+            self._dumper.join()
+            self._dumper = None
+
+
+TRACER = Tracer()
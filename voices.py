@@ -0,0 +1,161 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+    Active-note table of an output port
+
+    Counts the note_ons not released yet for each of the 16 x 128
+    (channel, pitch) keys of a port, whoever the player sending them, in a
+    bytearray indexed by channel << 7 | pitch: note_on and note_off
+    accounting is a single update. Note_offs of keys with nothing sounding
+    are redundant and dropped; panic() releases everything at once; a
+    per-channel polyphony limit steals the oldest voice of a channel when a
+    note_on would go over it.
+"""
+
+from __future__ import division, print_function
+from array import array
+
+import numpy as np
+
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+N_KEYS = 16 * 128
+
+
+class ActiveNotes(object):
+    """ Notes sounding on a port, filtering the bursts sent to it
+
+        Args:
+            polyphony: maximum number of notes sounding at once on each
+                       channel (None or 0: no limit), see set_limit
+    """
+
+    def __init__(self, polyphony=None):
+        self.counts = bytearray(N_KEYS)     # note_ons not released, per key
+        self.voices = array('i', bytes(4 * 16))    # Notes sounding per channel
+        self.limits = array('i', [polyphony or 0] * 16)
+        self._onsets = array('q', bytes(8 * N_KEYS))   # Age of the last note_on
+        self._n = 0
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        self.deduplicated = 0
+        self.stolen = 0
+        self.panics = 0
+        self.max_voices = 0
+
+    def metrics(self):
+        return {
+            'sounding': sum(self.voices),
+            'max_voices': self.max_voices,
+            'deduplicated': self.deduplicated,
+            'stolen': self.stolen,
+            'panics': self.panics,
+        }
+
+    def set_limit(self, channel, polyphony):
+        """ Polyphony limit of a channel (0: no limit) """
+        self.limits[channel] = polyphony or 0
+
+    def sounding(self, channel=None):
+        """ (channel, pitch) of the notes sounding, in key order """
+        counts = np.frombuffer(self.counts, np.uint8)
+        if channel is not None:
+            keys = np.flatnonzero(counts[channel << 7:(channel + 1) << 7])
+            return [(channel, int(k)) for k in keys]
+        return [(int(k) >> 7, int(k) & 127) for k in np.flatnonzero(counts)]
+
+    def note_on(self, key):
+        """ Account a note_on
+
+            Returns:
+                key of the voice to steal first, or -1
+        """
+        channel = key >> 7
+        stolen = -1
+        limit = self.limits[channel]
+        if limit and self.voices[channel] >= limit:
+            stolen = self.oldest(channel)
+            self.note_off(stolen)
+            self.stolen += 1
+        if self.counts[key] < 255:
+            self.counts[key] += 1
+            self.voices[channel] += 1
+            self.max_voices = max(self.max_voices, self.voices[channel])
+        self._n += 1
+        self._onsets[key] = self._n
+        return stolen
+
+    def note_off(self, key):
+        """ Account a note_off
+
+            Returns:
+                False if nothing was sounding (the note_off is redundant)
+        """
+        if not self.counts[key]:
+            return False
+        self.counts[key] -= 1
+        self.voices[key >> 7] -= 1
+        return True
+
+    def oldest(self, channel):
+        """ Key of the channel's note sounding for the longest time """
+        base = channel << 7
+        onsets = self._onsets
+        counts = self.counts
+        return min((k for k in range(base, base + 128) if counts[k]),
+                   key=onsets.__getitem__)
+
+    def filter(self, batch):
+        """ Messages of a burst to send, with their note_offs deduplicated
+            and the voices stolen to keep within the limits released first
+
+            Args:
+                batch: list of message bytes
+        """
+        out = []
+        for data in batch:
+            kind = data[0] & 0xF0
+            if kind == NOTE_ON and data[2] > 0:
+                stolen = self.note_on((data[0] & 0x0F) << 7 | data[1])
+                if stolen >= 0:
+                    out.append(bytes((NOTE_OFF | stolen >> 7, stolen & 127, 0)))
+            elif kind == NOTE_OFF or kind == NOTE_ON:
+                if not self.note_off((data[0] & 0x0F) << 7 | data[1]):
+                    self.deduplicated += 1
+                    continue
+            out.append(data)
+        return out
+
+    def panic(self, channels=None):
+        """ Note_offs releasing every note sounding, one per note_on
+
+            The table is cleared: the caller must send them.
+
+            Args:
+                channels: channels to release (default: all of them)
+
+            Returns:
+                list of note_off bytes
+        """
+        counts = np.frombuffer(self.counts, np.uint8)
+        if channels is None:
+            mask = counts
+        else:
+            mask = np.zeros(N_KEYS, np.uint8)
+            for c in channels:
+                mask[c << 7:(c + 1) << 7] = counts[c << 7:(c + 1) << 7]
+        keys = np.flatnonzero(mask)
+        keys = np.repeat(keys, mask[keys])
+        messages = np.empty((len(keys), 3), np.uint8)
+        messages[:, 0] = NOTE_OFF | keys >> 7
+        messages[:, 1] = keys & 127
+        messages[:, 2] = 0
+        data = messages.tobytes()
+        for c in range(16) if channels is None else channels:
+            self.counts[c << 7:(c + 1) << 7] = bytes(128)
+            self.voices[c] = 0
+        self.panics += 1
+        return [data[i:i+3] for i in range(0, len(data), 3)]